@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# Benchmarks of splitSaphyrBNXByScan.py on synthetic bnx files written by generateSyntheticBNX.py.
+# For each case and size, times the first read (findNumberColumnsPerBank), the second read (readBNXFile), and end-to-end
+# -s 1 and -r runs of the command line with different options. Reports MB/s and molecules/s and compares them to the
+# stored baseline, baseline.json. The new bnx files of each run must be byte for byte the same as the line by line run
+# (--copyBlocks 0), and as the checksums in baseline.json, written by the original implementation.
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.dirname(BENCH_DIR))
+
+from saphyrbnx.index import findNumberColumnsPerBank
+from saphyrbnx.scans import determineRunIDPerScan,groupRunIDByScan,parseScanRange,computeNumMoleculesPerBNX
+from saphyrbnx.split import readBNXFile
+from saphyrbnx.bnxio import openBNXFile,openOutputFile,fileCompression
+from saphyrbnx.batch import assignPrefixes
+from generateSyntheticBNX import generateSyntheticBNX
+
+SCRIPT = os.path.join(os.path.dirname(BENCH_DIR),'splitSaphyrBNXByScan.py')
+
+#benchmark cases: name, layout, colors, interrupted, number of scans.
+CASES = [['137_1color','137',1,False,30],
+         ['69_2color','69',2,False,30],
+         ['34x4_2color_interrupted','34x4',2,True,30]]
+
+#command line runs: name, options and input, see runInputs: '' for the synthetic bnx file, 'gz' for the synthetic bnx file
+#compressed with gzip, 'growing' for a copy of the synthetic bnx file written while the run reads it, 'batch' for the
+#synthetic bnx file and its gzip copy in batch mode (the new bnx files of each are compared), 'twice' for the synthetic
+#bnx file given two times.
+#runs are in order: a run with --indexCache 1 (--columnar 1) after the first one of a case reads the index cache file
+#(columnar directory) of the first.
+#the first run of each selection (the name up to the first '_') is the reference output of the selection, for example
+#'lines' (--copyBlocks 0) for -s 1 and -r. the checksums of 'merge' in baseline.json were written by the first version
+#of --merge, whose new bnx file is the same as the --singlePass new bnx file of all scans except for the molecule IDs.
+RUNS = [['s1_lines',['-s','1','--copyBlocks','0'],''],
+        ['s1',['-s','1'],''],
+        ['s1_singlePass',['-s','1','--singlePass','1'],''],
+        ['s1_t4',['-s','1','-t','4'],''],
+        ['s1_pipeline',['-s','1','--engine','pipeline'],''],
+        ['s1_bytes',['-s','1','--engine','bytes'],''],
+        ['s1_gz',['-s','1','-z','gz'],''],
+        ['s1_zst',['-s','1','-z','zst'],''],
+        ['s1_pipelineZst',['-s','1','--engine','pipeline','-z','zst'],''],
+        ['s1_gzInput',['-s','1'],'gz'],
+        ['s1_maxOpenFiles2',['-s','1','--maxOpenFiles','2'],''],
+        ['s1_maxOpenFiles2gz',['-s','1','--maxOpenFiles','2','-z','gz'],''],
+        ['s1_outputBuffer0',['-s','1','--outputBufferMB','0'],''],
+        ['s1_indexCache',['-s','1','--indexCache','1'],''],
+        ['s1_indexCacheHit',['-s','1','--indexCache','1'],''],
+        ['s1_columnar',['-s','1','--columnar','1'],''],
+        ['s1_columnarHit',['-s','1','--columnar','1'],''],
+        ['s1_follow',['-s','1','--follow','1','--pollSeconds','0','--idleSeconds','0'],''],
+        ['s1_followGrowing',['-s','1','--follow','1','--pollSeconds','0.1','--idleSeconds','1'],'growing'],
+        ['s1_batch',['-s','1','-j','2'],'batch'],
+        ['r_lines',['-s','0','-r','2-4,10','--copyBlocks','0'],''],
+        ['r',['-s','0','-r','2-4,10'],''],
+        ['r_t4',['-s','0','-r','2-4,10','-t','4'],''],
+        ['r_pipeline',['-s','0','-r','2-4,10','--engine','pipeline'],''],
+        ['r_bytes',['-s','0','-r','2-4,10','--engine','bytes'],''],
+        ['r_gz',['-s','0','-r','2-4,10','-z','gz'],''],
+        ['r_gzInput',['-s','0','-r','2-4,10'],'gz'],
+        ['r_columnar',['-s','0','-r','2-4,10','--columnar','1'],''],
+        ['filters_lines',['-s','1','--minLength','150000','--minLabels','8'],''],
+        ['filters_gz',['-s','1','--minLength','150000','--minLabels','8','-z','gz'],''],
+        ['filters_columnar',['-s','1','--minLength','150000','--minLabels','8','--columnar','1'],''],
+        ['rfilters',['-s','0','-r','2-4,10','--minLength','150000','--minLabels','8'],''],
+        ['shards_bytes',['-s','1','--shards','4','--shardBy','bytes'],''],
+        ['shards_bytes_gzInput',['-s','1','--shards','4','--shardBy','bytes'],'gz'],
+        ['shards_bytes_gzIndexCache',['-s','1','--shards','4','--shardBy','bytes','--indexCache','1'],'gz'],
+        ['shards_bytes_gzIndexCacheHit',['-s','1','--shards','4','--shardBy','bytes','--indexCache','1'],'gz'],
+        ['merge',['-s','1','--merge','1'],'twice'],
+        ['merge_j1',['-s','1','--merge','1','-j','1'],'twice']]
+
+#number of parts and seconds between the parts of the 'growing' input.
+GROW_PARTS = 10
+GROW_SECONDS = 0.2
+
+
+#function returns dict of md5 checksum of each file in directory outDir, key is the file name.
+#compressed new bnx files (.gz, .zst) are decompressed, key is the file name without the compression suffix, so that
+#they are compared to the new bnx files that are not compressed. checkpoint files of --follow are not compared.
+def outputChecksums(outDir):
+    checksums = {}
+    for name in sorted(os.listdir(outDir)):
+        if name[-21:] == '_live_checkpoint.json':
+            continue
+        md5 = hashlib.md5()
+        infile = openBNXFile(os.path.join(outDir,name))
+        for line in infile:
+            md5.update(line)
+        infile.close()
+
+        compression = fileCompression(name)
+        if len(compression) > 0:
+            name = name[0:-len(compression)-1]
+        checksums[name] = md5.hexdigest()
+
+    return checksums
+
+
+#function writes synthetic bnx file of case and size in workDir, if not already there. returns file name and number of molecules.
+def syntheticFile(workDir,case,sizeMB):
+    name,layout,colors,interrupted,numScans = case
+    filename = os.path.join(workDir,'synthetic_'+name+'_'+str(sizeMB)+'MB.bnx')
+    infoFile = filename+'.json'
+
+    if not os.path.exists(infoFile):
+        info = generateSyntheticBNX(filename,layout,numScans,colors,sizeMB,interrupted)
+        outfile = open(infoFile,'w')
+        json.dump(info,outfile)
+        outfile.close()
+
+    infile = open(infoFile,'r')
+    info = json.load(infile)
+    infile.close()
+
+    return filename,info['numMolecules']
+
+
+#function removes the index cache files and columnar directories of bnx file filename and of its gzip copy, written
+#next to them by earlier runs, so that the first run of each case with --indexCache or --columnar reads the bnx file.
+def removeCaches(filename):
+    for name in (filename,filename+'.gz'):
+        if os.path.exists(name+'.scanIndex.json'):
+            os.remove(name+'.scanIndex.json')
+        if os.path.exists(name+'.columnar'):
+            shutil.rmtree(name+'.columnar')
+
+
+#function returns the name of bnx file filename compressed with gzip, written next to it if not already there.
+def gzipFile(filename):
+    gzFilename = filename+'.gz'
+    if not os.path.exists(gzFilename):
+        infile = open(filename,'rb')
+        outfile = gzip.open(gzFilename+'.tmp','wb',compresslevel=1)
+        shutil.copyfileobj(infile,outfile,16*1024*1024)
+        outfile.close()
+        infile.close()
+        os.rename(gzFilename+'.tmp',gzFilename)
+
+    return gzFilename
+
+
+#function returns [seconds,MB/s,molecules/s] of reading numBytes and numMolecules in seconds.
+def rates(seconds,numBytes,numMolecules):
+    seconds = max(seconds,1e-9)
+    return [seconds,numBytes/1024.0/1024.0/seconds,numMolecules/seconds]
+
+
+#function times the first and second read of bnx file filename in this process, for -s 1.
+def timePhases(filename,outDir):
+    startTime = time.perf_counter()
+    maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList = findNumberColumnsPerBank(filename)
+    statsTime = time.perf_counter()-startTime
+
+    runIDPerScan = determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash)
+    runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+    scanHash = parseScanRange(1,runIDToScanHash,'')
+    numMolPerFile = computeNumMoleculesPerBNX(1,runIDList,scanHash,runIDToScanHash,molNumPerRunID)
+
+    startTime = time.perf_counter()
+    readBNXFile(1,numMolPerFile,scanHash,runIDToScanHash,filename,os.path.join(outDir,'phase'),blockList)
+    splitTime = time.perf_counter()-startTime
+
+    return statsTime,splitTime
+
+
+#function returns the list of checksums of each bnx file of a batch run, see outputChecksums, with the names of the new
+#bnx files of the split of one bnx file, prefix 'out'. checksums: checksums of the batch run. inputs: its bnx files.
+def batchChecksums(checksums,inputs):
+    jobList = assignPrefixes([[f,''] for f in inputs],'out')
+    checksumList = [{} for job in jobList]
+    for name in checksums:
+        #job of the longest prefix, 'out_a_2_' before 'out_a_'.
+        jobIndex = -1
+        for i in range(0,len(jobList)):
+            jobPrefix = jobList[i][1]+'_'
+            if name[0:len(jobPrefix)] == jobPrefix and (jobIndex < 0 or len(jobPrefix) > len(jobList[jobIndex][1])+1):
+                jobIndex = i
+        if jobIndex >= 0:
+            checksumList[jobIndex]['out_'+name[len(jobList[jobIndex][1])+1:]] = checksums[name]
+
+    return checksumList
+
+
+#function writes bnx file filename to growFilename in GROW_PARTS parts, GROW_SECONDS apart. the first part is written
+#before it returns, the others by a thread, which is returned.
+def growFile(filename,growFilename):
+    infile = open(filename,'rb')
+    data = infile.read()
+    infile.close()
+    partSize = len(data)//GROW_PARTS+1
+
+    outfile = open(growFilename,'wb')
+    outfile.write(data[0:partSize])
+    outfile.flush()
+
+    def writeParts():
+        for start in range(partSize,len(data),partSize):
+            time.sleep(GROW_SECONDS)
+            outfile.write(data[start:start+partSize])
+            outfile.flush()
+        outfile.close()
+
+    thread = threading.Thread(target=writeParts)
+    thread.start()
+    return thread
+
+
+#function returns the bnx files (-b) of a run with input runInput on bnx file filename, see RUNS, and the thread that
+#writes the 'growing' input (None for the other inputs).
+def runInputs(filename,runInput,workDir):
+    if runInput == 'gz':
+        return [gzipFile(filename)],None
+    elif runInput == 'batch':
+        return [filename,gzipFile(filename)],None
+    elif runInput == 'twice':
+        return [filename,filename],None
+    elif runInput == 'growing':
+        growFilename = os.path.join(workDir,'growing.bnx')
+        return [growFilename],growFile(filename,growFilename)
+    return [filename],None
+
+
+#function runs the command line with options on bnx files inputs, new bnx files in outDir. returns seconds.
+#the command line runs in outDir with prefix 'out' and bnx files relative to outDir, so that the text files of the run
+#have no directory in file names.
+def timeRun(inputs,outDir,options):
+    if os.path.exists(outDir):
+        shutil.rmtree(outDir)
+    os.makedirs(outDir)
+
+    startTime = time.perf_counter()
+    subprocess.check_call([sys.executable,SCRIPT,'-b']+[os.path.relpath(f,outDir) for f in inputs]+['-p','out']+options,
+                          stdout=subprocess.DEVNULL,cwd=outDir)
+    return time.perf_counter()-startTime
+
+
+#function runs the command line with --stats - on bnx file filename, new bnx files in outDir. returns an error message if
+#stdout is not only the JSON of the run time statistics, else ''.
+def checkStatsJSON(filename,outDir):
+    if os.path.exists(outDir):
+        shutil.rmtree(outDir)
+    os.makedirs(outDir)
+
+    output = subprocess.check_output([sys.executable,SCRIPT,'-b',os.path.abspath(filename),'-p','out','-s','1','--stats','-'],
+                                     stderr=subprocess.DEVNULL,cwd=outDir)
+    try:
+        stats = json.loads(output)
+    except ValueError as e:
+        return '--stats - output is not JSON: '+str(e)
+    if 'phases' not in stats:
+        return '--stats - output has no phases'
+    return ''
+
+
+#function writes truncated .gz and .zst copies of the first MB of bnx file filename in outDir, and runs the command line
+#on each. returns an error message if a run does not fail, else ''.
+def checkTruncatedInput(filename,outDir):
+    if os.path.exists(outDir):
+        shutil.rmtree(outDir)
+    os.makedirs(outDir)
+
+    infile = open(filename,'rb')
+    data = infile.read(1024*1024)
+    infile.close()
+
+    for compress in ('gz','zst'):
+        if compress == 'zst' and shutil.which('zstd') is None:
+            continue
+        truncatedFile = os.path.join(outDir,'truncated.bnx.'+compress)
+        outfile = openOutputFile(truncatedFile,compress)
+        outfile.write(data)
+        outfile.close()
+        os.truncate(truncatedFile,os.path.getsize(truncatedFile)//2)
+
+        returnCode = subprocess.call([sys.executable,SCRIPT,'-b',truncatedFile,'-p','out','-s','1'],
+                                     stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,cwd=outDir)
+        if returnCode == 0:
+            return 'truncated .'+compress+' input is not detected'
+    return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of splitSaphyrBNXByScan.py on synthetic bnx files.')
+    parser.add_argument("-m", "--sizesMB", help="sizes of synthetic bnx files in MB, comma separated. default=10",type=str,default='10')
+    parser.add_argument("-w", "--workDir", help="directory for synthetic bnx files (kept for later runs) and new bnx files. default=benchmarks/work",type=str,default=os.path.join(BENCH_DIR,'work'))
+    parser.add_argument("--baseline", help="baseline file. default=benchmarks/baseline.json",type=str,default=os.path.join(BENCH_DIR,'baseline.json'))
+    parser.add_argument("--updateBaseline", help="if --updateBaseline 1, save the MB/s of this run as the baseline. default=0",type=int,default=0)
+    parser.add_argument("--tolerance", help="a result slower than the baseline by more than this fraction is reported as a regression. default=0.2",type=float,default=0.2)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.workDir):
+        os.makedirs(args.workDir)
+
+    baseline = {'results':{},'checksums':{}}
+    if os.path.exists(args.baseline):
+        infile = open(args.baseline,'r')
+        baseline = json.load(infile)
+        infile.close()
+
+    results = {}
+    numMismatch = 0
+    numRegression = 0
+
+    print('# Case\tSizeMB\tStep\tSeconds\tMB/s\tMolecules/s\tBaselineMB/s')
+    for sizeMB in [float(s) for s in args.sizesMB.split(',')]:
+        for case in CASES:
+            filename,numMolecules = syntheticFile(args.workDir,case,sizeMB)
+            numBytes = os.path.getsize(filename)
+            caseKey = case[0]+'_'+str(sizeMB)+'MB'
+
+            #steps: [step name, seconds] of this case.
+            steps = []
+            outDir = os.path.join(args.workDir,'out_phases')
+            if os.path.exists(outDir):
+                shutil.rmtree(outDir)
+            os.makedirs(outDir)
+            statsTime,splitTime = timePhases(filename,outDir)
+            steps.append(['findNumberColumnsPerBank',statsTime])
+            steps.append(['readBNXFile',splitTime])
+
+            #reference: line by line output of each selection.
+            referenceHash = {}
+            removeCaches(filename)
+            for runName,options,runInput in RUNS:
+                inputs,growThread = runInputs(filename,runInput,args.workDir)
+                outDir = os.path.join(args.workDir,'out_'+runName)
+                steps.append([runName,timeRun(inputs,outDir,options)])
+                if growThread is not None:
+                    growThread.join()
+
+                selection = runName.split('_')[0]
+                checksumList = [outputChecksums(outDir)]
+                if runInput == 'batch':
+                    checksumList = batchChecksums(checksumList[0],inputs)
+
+                for checksums in checksumList:
+                    if selection not in referenceHash:
+                        referenceHash[selection] = checksums
+                        #original implementation checksums, if stored for this case.
+                        baselineChecksums = baseline['checksums'].get(caseKey+'_'+selection)
+                        if baselineChecksums is not None and baselineChecksums != checksums:
+                            print('#### MISMATCH: '+caseKey+' '+runName+' differs from the original implementation')
+                            numMismatch += 1
+                    elif checksums != referenceHash[selection]:
+                        print('#### MISMATCH: '+caseKey+' '+runName+' differs from line by line output')
+                        numMismatch += 1
+
+            #command line checks that are not timed.
+            for error in (checkStatsJSON(filename,os.path.join(args.workDir,'out_stats')),
+                          checkTruncatedInput(filename,os.path.join(args.workDir,'out_truncated'))):
+                if len(error) > 0:
+                    print('#### MISMATCH: '+caseKey+' '+error)
+                    numMismatch += 1
+
+            for stepName,seconds in steps:
+                key = caseKey+'_'+stepName
+                seconds,mbps,molps = rates(seconds,numBytes,numMolecules)
+                results[key] = mbps
+
+                baselineMBps = baseline['results'].get(key)
+                line = case[0]+'\t'+str(sizeMB)+'\t'+stepName+'\t%.3f\t%.1f\t%.0f\t' % (seconds,mbps,molps)
+                if baselineMBps is None:
+                    line += '-'
+                else:
+                    line += '%.1f' % baselineMBps
+                    if mbps < baselineMBps*(1.0-args.tolerance):
+                        line += '\tREGRESSION'
+                        numRegression += 1
+                print(line)
+
+    print('# '+str(numMismatch)+' output mismatches, '+str(numRegression)+' regressions')
+
+    if args.updateBaseline == 1:
+        baseline['results'].update(results)
+        outfile = open(args.baseline,'w')
+        json.dump(baseline,outfile,indent=1,sort_keys=True)
+        outfile.write('\n')
+        outfile.close()
+
+    if numMismatch > 0:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Writes a deterministic synthetic Saphyr bnx file for benchmarks: the same options and seed always give the same file.
+# Layouts are the ones determineRunIDPerScan handles: 137 (split FOV, 137 columns per bank), 69 (full FOV, 69 columns
+# per bank), and 34x4 (split FOV, each bank imaged as 4 runIDs with 34, 34, 34 and 35 columns).
+import sys
+import random
+import argparse
+
+#columns of each runID in a bank for each layout.
+LAYOUTS = {'137':[137],'69':[69],'34x4':[34,34,34,35]}
+
+#number of banks in a flow cell.
+NUM_BANKS = 4
+
+
+#function makes the 1, 2, QX11, QX12, QX21, QX22 lines of numBodies molecules with random labels. each is [length,numLabels,bytes].
+#molecules of the bnx file reuse these, so writing a large bnx file is fast.
+def makeMoleculeBodies(rnd,colors,numBodies):
+    bodies = []
+    for i in range(0,numBodies):
+        length = 20000.0+rnd.random()*480000.0
+        labelLines = []
+        qxLines = []
+        numLabels = 0
+        for c in range(1,colors+1):
+            n = int(length/10000.0*rnd.random())+1
+            numLabels += n
+            positions = sorted(length*rnd.random() for j in range(0,n))
+            labelLines.append(str(c)+''.join('\t%.2f' % p for p in positions)+'\t%.2f\n' % length)
+            qxLines.append('QX'+str(c)+'1'+''.join('\t%.4f' % (2.0+38.0*rnd.random()) for j in range(0,n))+'\n')
+            qxLines.append('QX'+str(c)+'2'+''.join('\t%.4f' % (0.1+1.9*rnd.random()) for j in range(0,n))+'\n')
+        bodies.append([length,numLabels,''.join(labelLines+qxLines)])
+
+    return bodies
+
+
+#function writes synthetic bnx file filename. targetMB is the approximate size in MB.
+#if interrupted, the last scan stops after its first bank, like a run that did not finish imaging the flow cell.
+#about 3% of banks have no molecules in the last column (low loading), so that maxColID of some runIDs is less than the layout maximum.
+#returns dict with numMolecules, numRunIDs and numScans.
+def generateSyntheticBNX(filename,layout='137',numScans=30,colors=1,targetMB=10.0,interrupted=False,seed=1):
+    rnd = random.Random(seed)
+    bodies = makeMoleculeBodies(rnd,colors,512)
+
+    #runList: [runID,number of columns] of each runID, in imaging order.
+    runList = []
+    for s in range(0,numScans):
+        for b in range(0,NUM_BANKS):
+            if interrupted and s == numScans-1 and b > 0:
+                break
+            for numCols in LAYOUTS[layout]:
+                runList.append([len(runList)+1,numCols])
+
+    #number of molecules per column so that the file is about targetMB.
+    avgBytes = sum(len(b[2]) for b in bodies)/float(len(bodies))+150.0
+    numColumns = sum(r[1] for r in runList)
+    molPerCol = max(1.0,targetMB*1024*1024/avgBytes/numColumns)
+
+    #colCounts: number of molecules of each column of each runID.
+    colCounts = []
+    for runID,numCols in runList:
+        counts = [int(molPerCol*(0.5+rnd.random())+0.5) for c in range(0,numCols)]
+        counts[-1] = max(1,counts[-1])
+        if rnd.random() < 0.03:
+            counts[-1] = 0
+        colCounts.append(counts)
+    numMolecules = sum(sum(c) for c in colCounts)
+
+    outfile = open(filename,'w')
+    outfile.write('# BNX File Version:\t1.3\n')
+    outfile.write('# Label Channels:\t'+str(colors)+'\n')
+    outfile.write('# Nickase Recognition Site 1:\tcttaag/DLE-1\n')
+    if colors == 2:
+        outfile.write('# Nickase Recognition Site 2:\tgctcttc/Nt.BspQI\n')
+    outfile.write('# Bases per Pixel:\t500\n')
+    outfile.write('# Number of Molecules:\t'+str(numMolecules)+'\n')
+    outfile.write('# Min Label SNR:\t2.00\n')
+    outfile.write('#rh\tSourceFolder\tInstrumentSerial\tTime\tNanoChannelPixelsPerScan\tStretchFactor\tBasesPerPixel\tNumberofScans\tChipId\tFlowCell\tSNRFilterType\tMinMoleculeLength\tMinLabelSNR\tRunId\n')
+    for runID,numCols in runList:
+        outfile.write('# Run Data\t/synthetic/Scan%03d\tSaphyr_SYNTH\t01/01/2020 00:00:00 AM\t%d\t0.85\t500\t1\tchips,SN_SYNTHETIC\t1\tdynamic\t0.00\t2.00\t%d\n' % ((runID-1)//(NUM_BANKS*len(LAYOUTS[layout]))+1,100000000+runID,runID))
+    outfile.write('#0h LabelChannel\tMoleculeID\tLength\tAvgIntensity\tSNR\tNumberofLabels\tOriginalMoleculeId\tScanNumber\tScanDirection\tChipId\tFlowcell\tRunId\tColumn\tStartFOV\tStartX\tStartY\tEndFOV\tEndX\tEndY\tGlobalScanNumber\n')
+    outfile.write('#0f\tint\tint\tfloat\tfloat\tfloat\tint\tint\tint\tint\tstring\tint\tint\tint\tint\tint\tint\tint\tint\tint\tint\n')
+    outfile.write('#1h LabelChannel\tLabelPositions[N]\n')
+    outfile.write('#1f\tint\tfloat\n')
+    outfile.write('#Qh QualityScoreID\tQualityScores[N]\n')
+    outfile.write('#Qf\tstring\tfloat[N]\n')
+
+    moleculeID = 0
+    lines = []
+    for i in range(0,len(runList)):
+        runID,numCols = runList[i]
+        scanNum = i//(NUM_BANKS*len(LAYOUTS[layout]))+1
+        for c in range(0,numCols):
+            for m in range(0,colCounts[i][c]):
+                moleculeID += 1
+                length,numLabels,body = bodies[int(rnd.random()*len(bodies))]
+                lines.append('0\t%d\t%.2f\t%.2f\t%.2f\t%d\t%d\t1\t-1\tchips,SN_SYNTHETIC\t1\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%d\t%d\n' %
+                             (moleculeID,length,200.0+800.0*rnd.random(),5.0+25.0*rnd.random(),numLabels,moleculeID,runID,c+1,
+                              int(rnd.random()*100)+1,int(rnd.random()*1000),int(rnd.random()*2000),int(rnd.random()*100)+1,
+                              int(rnd.random()*1000),int(rnd.random()*2000),scanNum))
+                lines.append(body)
+
+                #write in large pieces.
+                if len(lines) >= 20000:
+                    outfile.write(''.join(lines))
+                    lines = []
+    outfile.write(''.join(lines))
+    outfile.close()
+
+    return {'numMolecules':numMolecules,'numRunIDs':len(runList),'numScans':numScans}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a deterministic synthetic Saphyr bnx file for benchmarks.')
+    parser.add_argument("-o", "--output", help="output bnx file name",type=str,required=True)
+    parser.add_argument("-l", "--layout", help="columns per bank: 137, 69 or 34x4. default=137",type=str,default='137',choices=sorted(LAYOUTS))
+    parser.add_argument("-n", "--numScans", help="number of scans. default=30",type=int,default=30)
+    parser.add_argument("-c", "--colors", help="number of label colors, 1 or 2. default=1",type=int,default=1,choices=[1,2])
+    parser.add_argument("-m", "--sizeMB", help="approximate size of bnx file in MB. default=10",type=float,default=10.0)
+    parser.add_argument("-i", "--interrupted", help="if -i 1, the last scan stops after its first bank. default=0",type=int,default=0)
+    parser.add_argument("--seed", help="random seed. default=1",type=int,default=1)
+    args = parser.parse_args()
+
+    info = generateSyntheticBNX(args.output,args.layout,args.numScans,args.colors,args.sizeMB,args.interrupted == 1,args.seed)
+    print('Wrote '+args.output+': '+str(info['numMolecules'])+' molecules, '+str(info['numRunIDs'])+' runIDs, '+str(info['numScans'])+' scans')
+    sys.exit(0)
@@ -0,0 +1,12 @@
+# saphyrbnx: split Saphyr bnx files by scan number.
+# splitSaphyrBNXByScan.py is the command line, see cli.py. split_by_scan does the same from python,
+# follow_bnx splits a bnx file while it is written, merge_bnx merges the scans of several bnx files into one, and iter_molecules reads the molecules of a bnx file as MoleculeRecord objects.
+from .index import findNumberColumnsPerBank
+from .scans import determineRunIDPerScan,groupRunIDByScan,printRunIDInformation,parseScanRange,computeNumMoleculesPerBNX
+from .split import readBNXFile,split_by_scan
+from .records import MoleculeRecord,iter_molecules
+from .perf import RunStats
+from .live import follow_bnx
+from .merge import merge_bnx
+
+__version__ = '2.0'
@@ -0,0 +1,138 @@
+# Batch mode: split many bnx files (for example one per flowcell) in one run, with a bounded pool of processes.
+import os
+import time
+import concurrent.futures
+
+from .bnxio import fileCompression
+from .split import split_by_scan
+from .perf import RunStats
+
+
+#function reads manifest file of a batch. each line is a bnx file name, optionally followed by a tab and the output prefix
+#for that bnx file. empty lines and lines beginning with '#' are skipped.
+#returns list of [bnxFile,prefix], prefix is '' if not given.
+def readManifest(manifestFile):
+    jobList = []
+
+    infile = open(manifestFile,'r')
+    for line in infile:
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+
+        word = line.split('\t')
+        if len(word) > 1:
+            jobList.append([word[0],word[1]])
+        else:
+            jobList.append([word[0],''])
+    infile.close()
+
+    return jobList
+
+
+#function fills in the output prefix of each [bnxFile,prefix] in jobList that has none: prefix_<bnx file name without .bnx>.
+#if two bnx files have the same name, _2, _3, ... is added so that each bnx file has its own prefix.
+def assignPrefixes(jobList,prefix):
+    usedPrefixes = {}
+    for job in jobList:
+        if len(job[1]) > 0:
+            usedPrefixes[job[1]] = 1
+
+    for job in jobList:
+        if len(job[1]) == 0:
+            name = os.path.basename(job[0])
+            compression = fileCompression(name)
+            if len(compression) > 0:
+                name = name[0:-len(compression)-1]
+            if name[-4:] == '.bnx':
+                name = name[0:-4]
+
+            jobPrefix = prefix+'_'+name
+            n = 2
+            while jobPrefix in usedPrefixes:
+                jobPrefix = prefix+'_'+name+'_'+str(n)
+                n+=1
+            job[1] = jobPrefix
+            usedPrefixes[jobPrefix] = 1
+
+    return jobList
+
+
+#function returns the number of bnx files split at the same time: at most maxJobs (0 = number of CPUs divided by threads
+#per bnx file), at most maxIO, so that shared storage is not read by too many processes, and at most numJobs.
+def batchWorkers(numJobs,maxJobs,maxIO,threads):
+    if maxJobs <= 0:
+        if hasattr(os,'sched_getaffinity'):
+            numCPU = len(os.sched_getaffinity(0))
+        else:
+            numCPU = os.cpu_count() or 1
+        maxJobs = numCPU//max(1,threads)
+
+    return max(1,min(numJobs,maxJobs,maxIO))
+
+
+#function splits one bnx file of a batch with split_by_scan. jobArgs is the tuple (bnxFile,prefix,options),
+#options are keyword arguments of split_by_scan. returns summary dict of the bnx file, with status 'ok' or the error.
+#if options['stats'], the run time statistics of the bnx file are in the summary, key 'stats' (None if it failed).
+def runBatchJob(jobArgs):
+    bnxFile,prefix,options = jobArgs
+
+    summary = {'bnxFile':bnxFile,'prefix':prefix,'status':'ok','numScans':0,'numMolecules':0,'numFiles':0,'seconds':0.0,'stats':None}
+    startTime = time.time()
+    try:
+        stats = None
+        if options['stats']:
+            stats = RunStats()
+        result = split_by_scan(bnxFile,options['selection'],prefix,stats=stats,**options['splitOptions'])
+        summary['stats'] = result.get('stats')
+        summary['numScans'] = len(set(s[0] for s in result['runIDToScanHash'].values()))
+        summary['numMolecules'] = sum(result['numMolPerFile'].values())
+        summary['numFiles'] = len(set(result['filenameHash'].values()))
+    except Exception as e:
+        summary['status'] = 'failed: '+type(e).__name__+': '+str(e)
+    summary['seconds'] = time.time()-startTime
+
+    return summary
+
+
+#function splits each [bnxFile,prefix] in jobList with runBatchJob in a pool of numWorkers processes.
+#prints a line when each bnx file is done. returns list of summary dicts in order of jobList.
+#if stats, run time statistics of each bnx file are collected, see runBatchJob.
+def splitBatch(jobList,selection,splitOptions,numWorkers,stats=False):
+    summaryHash = {}
+
+    options = {'selection':selection,'splitOptions':splitOptions,'stats':stats}
+    executor = concurrent.futures.ProcessPoolExecutor(numWorkers)
+    try:
+        futureHash = {}
+        for i in range(0,len(jobList)):
+            future = executor.submit(runBatchJob,(jobList[i][0],jobList[i][1],options))
+            futureHash[future] = i
+
+        for future in concurrent.futures.as_completed(futureHash):
+            summary = future.result()
+            summaryHash[futureHash[future]] = summary
+            print('Done:\t'+summary['bnxFile']+'\t'+summary['status'])
+    finally:
+        executor.shutdown()
+
+    return [summaryHash[i] for i in range(0,len(jobList))]
+
+
+#function writes combined summary of a batch to prefix_batch_summary.txt and prints it.
+def printBatchSummary(summaryList,prefix):
+    header = '# BnxFile\tPrefix\tStatus\tNumScans\tNumFiles\tNumMolecules\tSeconds\n'
+    lines = []
+    for s in summaryList:
+        lines.append(s['bnxFile']+'\t'+s['prefix']+'\t'+s['status']+'\t'+str(s['numScans'])+'\t'+str(s['numFiles'])+'\t'+str(s['numMolecules'])+'\t'+'%.1f' % s['seconds']+'\n')
+
+    numFailed = len([s for s in summaryList if s['status'] != 'ok'])
+    total = '# Total:\t'+str(len(summaryList))+' bnx files, '+str(numFailed)+' failed, '+str(sum(s['numMolecules'] for s in summaryList))+' molecules\n'
+
+    outfile = open(prefix+'_batch_summary.txt','w')
+    outfile.write(header)
+    outfile.writelines(lines)
+    outfile.write(total)
+    outfile.close()
+
+    print(header+''.join(lines)+total,end='')
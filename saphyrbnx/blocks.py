@@ -0,0 +1,262 @@
+# Bytes engine (engine 'bytes'): the bnx file is read in large binary blocks instead of line by line. The lines of a
+# block are classified from their first byte with a regular expression, and only the runID and colID fields of each
+# 0 line are taken out of the block, without splitting or decoding the line. readBNXFile writes the molecules of a block
+# to the new bnx files as slices of the block, one write for each run of molecules with the same new bnx file.
+# The results and new bnx files are the same as reading the bnx file line by line.
+import re
+
+from .bnxio import openBNXFile,hasCRLF
+from .split import writeTitle
+
+#bytes read from the bnx file at a time. blocks are cut at the start of the last molecule in them.
+BLOCK_SIZE = 8*1024*1024
+
+#start of each line that is not a 1, 2, QX11, QX12, QX21 or QX22 line of a molecule: 0 lines, header lines and lines
+#that are not written to new bnx files. group 1 is empty at the start of the line. for 0 lines, group 2 is the runID
+#(field 11) and group 3 the colID (field 12), split by whitespace the same as line.split().
+#LINE_START finds lines after a '\n', which is much faster than '^' with re.M. FIRST_LINE is the first line of a block.
+LINE_PATTERN = rb'()(?:0\S*(?:[ \t\r\x0b\x0c]+\S+){10}[ \t\r\x0b\x0c]+(\S+)[ \t\r\x0b\x0c]+(\S+)|(?![12]|QX11|QX12|QX21|QX22))'
+LINE_START = re.compile(rb'\n'+LINE_PATTERN)
+FIRST_LINE = re.compile(LINE_PATTERN)
+
+#first byte of 0 lines and header lines.
+ZERO = ord('0')
+HASH = ord('#')
+
+
+#generator yields blocks of bnx file infile, open for reading bytes, about BLOCK_SIZE bytes each. each block has whole
+#lines and ends before the last 0 line in it, so that each block has whole molecules. if numBytes is at least 0, only
+#numBytes bytes are read.
+def iterBlocks(infile,numBytes=-1):
+    rest = b''  #bytes after the end of the last block.
+    while True:
+        size = BLOCK_SIZE
+        if numBytes >= 0:
+            size = min(BLOCK_SIZE,numBytes)
+            if size == 0:
+                break
+
+        data = infile.read(size)
+        if len(data) == 0:
+            break
+        if numBytes >= 0:
+            numBytes -= len(data)
+        data = rest+data
+
+        #end block at the start of the last molecule. if there is none, at the end of the last line.
+        cut = data.rfind(b'\n0\t')+1
+        if cut == 0:
+            cut = data.rfind(b'\n')+1
+        rest = data[cut:]
+
+        if cut > 0:
+            yield data[:cut]
+
+    if len(rest) > 0:
+        yield rest
+
+
+#generator yields a match of LINE_START for each line of block that is not a line 1, 2 or QX of a molecule, see LINE_START.
+#the start of the line is m.start(1). the last match may be at the end of the block, after the last '\n'.
+def lineStarts(block):
+    m = FIRST_LINE.match(block)
+    if m is not None:
+        yield m
+    for m in LINE_START.finditer(block):
+        yield m
+
+
+#function returns the end of the line of block that starts at pos, after the '\n'.
+def lineEnd(block,pos):
+    end = block.find(b'\n',pos)
+    if end < 0:
+        return len(block)
+    return end+1
+
+
+#function reads bnx file from byte offset start to byte offset end with the bytes engine, the same as scanBNXChunk.
+#chunkArgs is the tuple (filename,start,end,crlf,spoolDir,threads,progress) of scanBNXChunk. spool files (spoolDir)
+#are not written by the bytes engine. crlf is not needed, '\r' is whitespace when the fields are split.
+#progress is called after each block. returns runIDList,runIDMaxColHash,molNumPerRunID,maxColID,blockList of the chunk.
+def scanBNXChunkBytes(chunkArgs):
+    filename,start,end,crlf,spoolDir,threads,progress = chunkArgs
+    if len(spoolDir) > 0:
+        raise ValueError('spool files of single pass mode are not written by the bytes engine')
+
+    infile = openBNXFile(filename,threads)
+    if start > 0:
+        infile.seek(start)
+
+    #runIDList: runIDs of '# Run Data' lines. the hashes have bytes runIDs as keys while reading, str at the end.
+    runIDList = []
+    maxColHash = {}
+    molNumHash = {}
+    maxColID = 0
+
+    #blockList: [key,start,end] of each block of lines with the same key, see findNumberColumnsPerBank.
+    #moleculeKey: runID of the current molecule, '' before the first molecule of the chunk. lines 1, 2 and QX after a
+    #header line or a line that is not written belong to it, from byte continueAt of the block on (None: no such lines).
+    blockList = []
+    blockKey = None
+    moleculeKey = ''
+    continueAt = None
+
+    #function ends the current block and starts a new block at byte offset start of the bnx file, if key changed.
+    def startBlock(key,start):
+        nonlocal blockKey
+        if key != blockKey:
+            if len(blockList) > 0:
+                blockList[-1][2] = start
+            blockList.append([key,start,0])
+            blockKey = key
+
+    numMolecules = 0
+    offset = start  #byte offset of the start of the block in the bnx file.
+
+    for block in iterBlocks(infile,end-start):
+        blockLength = len(block)
+        for m in lineStarts(block):
+            pos = m.start(1)
+
+            #lines 1, 2 and QX between the last header line or line that is not written and this line.
+            if continueAt is not None and continueAt < min(pos,blockLength):
+                startBlock(moleculeKey,offset+continueAt)
+                continueAt = None
+
+            if pos >= blockLength:
+                break
+
+            first = block[pos]
+            if first == ZERO:
+                runID = m.group(2)
+                if runID is None:
+                    raise ValueError('0 line without runID and colID at byte '+str(offset+pos)+' of '+filename)
+                colID = int(m.group(3))
+                key = runID
+                moleculeKey = runID
+
+                if runID in molNumHash:
+                    molNumHash[runID] += 1
+                else:
+                    molNumHash[runID] = 1
+
+                if runID not in maxColHash or colID > maxColHash[runID]:
+                    maxColHash[runID] = colID
+                if colID > maxColID:
+                    maxColID = colID
+
+            elif first == HASH:
+                key = '#'
+
+                #if the line begins with '# Run Data', pull out runID value, the last field.
+                if block.startswith(b'# Run Data',pos):
+                    word = block[pos:lineEnd(block,pos)].strip().split(b'\t')
+                    runIDList.append(int(word[-1]))
+                    maxColHash[word[-1]] = 0
+
+            else:   #line that is not written to new bnx files.
+                key = ''
+
+            if first == ZERO:
+                continueAt = None
+            else:
+                continueAt = lineEnd(block,pos)
+
+            #if key changed, end current block and start new block at this line.
+            startBlock(key,offset+pos)
+
+        #lines 1, 2 and QX at the end of the block, after the last header line or line that is not written.
+        #if that line is the last line of the block, the lines may be at the start of the next block.
+        if continueAt is not None:
+            if continueAt < blockLength:
+                startBlock(moleculeKey,offset+continueAt)
+                continueAt = None
+            else:
+                continueAt = 0
+
+        offset += blockLength
+        numMolecules = sum(molNumHash.values())
+        if progress is not None:
+            progress(numMolecules)
+
+    infile.close()
+
+    #end last block at end of chunk. runID keys of blocks and hashes as str.
+    if len(blockList) > 0:
+        blockList[-1][2] = offset
+    for b in blockList:
+        if isinstance(b[0],bytes):
+            b[0] = b[0].decode()
+
+    runIDMaxColHash = dict((r.decode(),maxColHash[r]) for r in maxColHash)
+    molNumPerRunID = dict((r.decode(),molNumHash[r]) for r in molNumHash)
+
+    return runIDList,runIDMaxColHash,molNumPerRunID,maxColID,blockList
+
+
+#function reads bnx file with the bytes engine and writes each molecule to the new bnx file of its scan number in
+#openFileHash, the same as readBNXLines. header lines are written with writeTitle. molecules next to each other in a
+#block with the same new bnx file are written as one slice of the block.
+#if progress is given, progress(numMolecules) is called after each block.
+def bytesBNXFile(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads=1,progress=None):
+    #if file has '\r\n' line endings, change to '\n' like reading the file in universal newline mode.
+    crlf = hasCRLF(filename)
+    infile = openBNXFile(filename,threads)
+
+    #fileOfRunID: key runID as bytes, value new bnx file of its scan number, or None if the scan number is not written.
+    fileOfRunID = {}
+    for r in runIDToScanHash:
+        fileOfRunID[r.encode()] = openFileHash.get(str(runIDToScanHash[r][0]))
+
+    #current: new bnx file of the current molecule, lines of the molecule after a header line are written to it.
+    current = None
+    numMolecules = 0
+
+    for block in iterBlocks(infile):
+        if crlf:
+            block = block.replace(b'\r\n',b'\n')
+        blockLength = len(block)
+
+        #bytes runStart up to the current line are written to runFile (None: not written).
+        runStart = 0
+        runFile = current
+
+        for m in lineStarts(block):
+            pos = m.start(1)
+            if pos >= blockLength:
+                break
+
+            if block[pos] == ZERO:
+                runID = m.group(2)
+                if runID is None:
+                    raise ValueError('0 line without runID and colID in '+filename)
+                current = fileOfRunID[runID]
+                numMolecules += 1
+
+                #molecule goes to an other file than the molecules before it: write the run of molecules before it.
+                if current is not runFile:
+                    if runFile is not None and pos > runStart:
+                        runFile.write(block[runStart:pos])
+                    runStart = pos
+                    runFile = current
+                continue
+
+            #header line or line that is not written: write the run of molecules before it.
+            if runFile is not None and pos > runStart:
+                runFile.write(block[runStart:pos])
+
+            end = lineEnd(block,pos)
+            if block[pos] == HASH:
+                writeTitle(block[pos:end],openFileHash,sValue,numMolPerFile)
+
+            #lines after it belong to the current molecule.
+            runStart = end
+            runFile = current
+
+        if runFile is not None and blockLength > runStart:
+            runFile.write(block[runStart:blockLength])
+
+        if progress is not None:
+            progress(numMolecules)
+
+    infile.close()
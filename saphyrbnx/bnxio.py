@@ -0,0 +1,149 @@
+# Reading and writing bnx files: compressed files (.gz, .zst) and copying byte ranges of bnx files.
+import os
+import io
+import gzip
+import shutil
+import subprocess
+
+#optional: zstandard module for .zst files, used if the zstd program is not installed.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#function returns compression of file from file name: 'gz', 'zst', or '' if not compressed.
+def fileCompression(filename):
+    if filename[-3:] == '.gz':
+        return 'gz'
+    elif filename[-4:] == '.zst':
+        return 'zst'
+    return ''
+
+
+#file name suffix for compression compress.
+def compressSuffix(compress):
+    if len(compress) > 0:
+        return '.'+compress
+    return ''
+
+
+#class runs a compression program (pigz, zstd) in a separate process, and reads its output or writes its input through a pipe.
+#the program (de)compresses with its own threads at the same time as this code reads or writes lines.
+#mode 'r' reads, 'w' writes a new file, 'a' appends to the file (a new gzip member or zstd frame, read as one stream).
+class PipeFile(object):
+    def __init__(self,command,filename,mode):
+        self.mode = mode
+        if mode == 'r':     #program reads compressed file filename, writes decompressed data to pipe.
+            self.outfile = None
+            self.proc = subprocess.Popen(command+[filename],stdout=subprocess.PIPE,bufsize=1024*1024)
+            self.pipe = self.proc.stdout
+        else:               #program reads data from pipe, writes compressed file filename.
+            self.outfile = open(filename,'ab' if mode == 'a' else 'wb')
+            self.proc = subprocess.Popen(command,stdin=subprocess.PIPE,stdout=self.outfile,bufsize=1024*1024)
+            self.pipe = self.proc.stdin
+        self.command = command
+
+    def __iter__(self):
+        return iter(self.pipe)
+
+    def readline(self):
+        return self.pipe.readline()
+
+    def read(self,size=-1):
+        return self.pipe.read(size)
+
+    def write(self,data):
+        self.pipe.write(data)
+
+    def close(self):
+        #if file is closed before the end of the data (for example after reading header lines), stop the program.
+        #else wait for the program and check if it failed, for example on a truncated compressed file: the data ends
+        #early and the program exits with an error.
+        stopped = False
+        if self.mode == 'r' and len(self.pipe.read(1)) > 0:
+            self.proc.terminate()
+            stopped = True
+        self.pipe.close()
+
+        returnCode = self.proc.wait()
+        if self.outfile is not None:
+            self.outfile.close()
+
+        if returnCode != 0 and not stopped:
+            raise IOError(' '.join(self.command)+' failed with exit code '+str(returnCode))
+
+
+#function opens bnx file filename for reading in binary mode. .gz and .zst files are decompressed.
+#pigz or zstd programs are used if installed, they decompress in a separate process. else the gzip or zstandard module is used.
+def openBNXFile(filename,threads=1):
+    compression = fileCompression(filename)
+
+    if compression == 'gz':
+        if shutil.which('pigz') is not None:
+            return PipeFile(['pigz','-dc','-p',str(threads)],filename,'r')
+        return io.BufferedReader(gzip.open(filename,'rb'),1024*1024)
+
+    elif compression == 'zst':
+        if shutil.which('zstd') is not None:
+            return PipeFile(['zstd','-dcq'],filename,'r')
+        elif zstandard is not None:
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(filename,'rb')),1024*1024)
+        raise IOError('reading a .zst file needs the zstd program or the zstandard python module: '+filename)
+
+    return open(filename,'rb')
+
+
+#function returns True if bnx file filename has '\r\n' line endings, checked on the first line.
+def hasCRLF(filename):
+    infile = openBNXFile(filename)
+    firstLine = infile.readline()
+    infile.close()
+
+    return firstLine[-2:] == b'\r\n'
+
+
+#function opens new bnx file filename for writing. if compress is 'gz' or 'zst', the file is compressed with threads threads.
+#pigz or zstd programs are used if installed, they compress in a separate process. else the gzip or zstandard module is used.
+#if append, data is added at the end of the file, see OutputPool.
+def openOutputFile(filename,compress='',threads=1,append=False):
+    mode = 'ab' if append else 'wb'
+
+    if compress == 'gz':
+        if shutil.which('pigz') is not None:
+            return PipeFile(['pigz','-c','-p',str(threads)],filename,mode[0])
+        return gzip.open(filename,mode)
+
+    elif compress == 'zst':
+        if shutil.which('zstd') is not None:
+            return PipeFile(['zstd','-cq','-T'+str(threads)],filename,mode[0])
+        elif zstandard is not None:
+            return zstandard.ZstdCompressor(threads=threads).stream_writer(open(filename,mode))
+        raise IOError('writing a .zst file needs the zstd program or the zstandard python module: '+filename)
+
+    return open(filename,mode)
+
+
+#copy bytes start to end of bnx file infile to open file outfile.
+#if outfile is a plain file, os.copy_file_range copies the bytes inside the kernel without reading them into python.
+#else, or if the file system does not support copy_file_range, the bytes are copied from memory map mm of infile
+#in chunks of at most 16 MB. an OutputFile (see outputs.py) copies the bytes to its own file handle.
+def copyByteRange(infile,mm,outfile,start,end):
+    if hasattr(outfile,'copyRange'):
+        outfile.copyRange(infile,mm,start,end)
+        return
+
+    if hasattr(os,'copy_file_range') and isinstance(outfile,io.BufferedWriter):
+        outfile.flush()     #write buffered lines of outfile before the copied bytes.
+        try:
+            while start < end:
+                n = os.copy_file_range(infile.fileno(),outfile.fileno(),end-start,start)
+                if n == 0:  #end of infile.
+                    break
+                start += n
+        except OSError:     #not supported, copy the remaining bytes from mm.
+            pass
+
+    chunk = 16*1024*1024
+    for i in range(start,end,chunk):
+        outfile.write(mm[i:min(i+chunk,end)])
@@ -0,0 +1,187 @@
+# Command line of splitSaphyrBNXByScan.py. main parses the options and calls split_by_scan.
+import os
+import sys
+import argparse
+import contextlib
+
+from .split import split_by_scan
+from .live import follow_bnx
+from .merge import merge_bnx
+from .perf import RunStats,writeStats,runProfiled
+from .batch import readManifest,assignPrefixes,batchWorkers,splitBatch,printBatchSummary
+
+
+#function returns the argument parser of the command line.
+def buildParser():
+    parser = argparse.ArgumentParser(description='Code filters bnx file based on scan number. Writes a new filtered BNX file based on input from user. Code should work for a 1 or 2 color bnx file.')
+    parser.add_argument("-b", "--bnxFile", help="full original bnx filename. More than one bnx file can be given (-b a.bnx b.bnx, or -b several times), each is split in batch mode with its own prefix, -p_<bnx file name>",type=str,nargs='+',action='extend',default=[])
+    parser.add_argument("-s", "--byScan", help="if -s 1, then print a bnx file for each scan #. if -s 0 print bnx file for range of scan numbers listed by user in -r. IMPORTANT: Must give values for -r if -s 0. default=0",type=int,default=0,choices=[0,1])
+    parser.add_argument("-r", "--scanRange", help="range of scan numbers to print new bnx file. For exmaple: 1-10,15-20 will print new bnx file with scans 1 through 10 and 15 through 20, but skip scans 11 through 14. default = '' ",type=str,default='')
+    parser.add_argument("-p", "--prefix", help="output bnx file prefix. default=some_great_data",type=str,default='some_great_data')
+    parser.add_argument("-t", "--threads", help="number of processes used to read the bnx file the first time. The bnx file is split into chunks that start at a molecule and each chunk is read by one process. Also the number of threads to compress or decompress .gz and .zst files. default=1",type=int,default=1)
+    parser.add_argument("--singlePass", help="if --singlePass 1, read the bnx file only once. Molecules are written to spool files per runID while finding the number of columns, then the spool files are combined into the new bnx files. Needs free disk space about the size of the bnx file. If the bnx file has header lines after the first molecule, or runIDs out of order, it is read a second time instead, so that the new bnx files are the same. default=0",type=int,default=0)
+    parser.add_argument("--copyBlocks", help="if --copyBlocks 1, use the byte offsets of each runID found while reading the bnx file the first time to copy whole blocks of molecules to the new bnx files. if --copyBlocks 0, read the bnx file line by line again. default=1",type=int,default=1)
+    parser.add_argument("--spoolDir", help="directory for spool files if --singlePass 1. A temporary directory is made inside it and removed at the end. default = directory of output prefix",type=str,default='')
+    parser.add_argument("-z", "--compressOutput", help="if -z gz or -z zst, compress new bnx files with gzip or zstd, using -t threads. A .gz or .zst bnx file (-b) is always decompressed while reading. default = '' (not compressed)",type=str,default='',choices=['','gz','zst'])
+    parser.add_argument("--indexCache", help="if --indexCache 1, save the runIDs, maximum colID and number of molecules per runID, and byte offsets of each runID, in an index cache file after reading the bnx file the first time. Later runs on the same bnx file read the index cache file instead. The cache file is not used if the size, modification time or header of the bnx file changed. default=0",type=int,default=0)
+    parser.add_argument("--manifest", help="batch mode: file with one bnx file per line, optionally followed by a tab and the output prefix for that bnx file. default = '' ",type=str,default='')
+    parser.add_argument("-j", "--jobs", help="batch mode: maximum number of bnx files split at the same time. default=0, the number of CPUs divided by -t",type=int,default=0)
+    parser.add_argument("--maxIO", help="batch mode: maximum number of bnx files read at the same time, so that shared storage is not read by too many processes. default=4",type=int,default=4)
+    parser.add_argument("--columnar", help="if --columnar 1, convert the bnx file once to a columnar directory of numpy arrays (<bnxFile>.columnar or in --cacheDir) and split from it. Later runs on the same bnx file split from the columnar directory without reading the bnx file. The columnar directory is converted again if the size, modification time or header of the bnx file changed. A columnar directory can also be given to -b. default=0",type=int,default=0)
+    parser.add_argument("--minLength", help="write only molecules with length (0 line) at least --minLength. default=0 (no filter)",type=float,default=0)
+    parser.add_argument("--minLabels", help="write only molecules with at least --minLabels labels (0 line). default=0 (no filter)",type=int,default=0)
+    parser.add_argument("--minSNR", help="write only molecules with mean label SNR (QX11 and QX21 lines) at least --minSNR. default=0 (no filter)",type=float,default=0)
+    parser.add_argument("--minIntensity", help="write only molecules with mean label intensity (QX12 and QX22 lines) at least --minIntensity. default=0 (no filter)",type=float,default=0)
+    parser.add_argument("--excludeColID", help="do not write molecules with these colID values. For example: 1,2,130-137. default = '' ",type=str,default='')
+    parser.add_argument("--excludeRunID", help="do not write molecules with these runID values. For example: 5,17-20. default = '' ",type=str,default='')
+    parser.add_argument("--maxOpenFiles", help="maximum number of new bnx files open at the same time. If there are more scans, the least recently written file is closed and opened again in append mode when needed. default=256",type=int,default=256)
+    parser.add_argument("--outputBufferMB", help="total memory in MB of the write buffers of the new bnx files. Each new bnx file is written in chunks of up to 4 MB. default=256",type=int,default=256)
+    parser.add_argument("--engine", help="how the bnx file is read line by line the second time: 'lines' reads, sorts and writes each line in turn. 'pipeline' reads large blocks in a reader thread and writes the new bnx files in writer threads while the lines are sorted. 'bytes' reads the bnx file both times in large blocks, takes only the runID and colID fields out of each 0 line, and writes molecules as slices of the blocks. 'pipeline' and 'bytes' do not use --copyBlocks or --singlePass. The new bnx files are the same. default=lines",type=str,default='lines',choices=['lines','pipeline','bytes'])
+    parser.add_argument("--shards", help="if --shards N, write the molecules of the selected scans (all scans with -s 1, the -r scans with -s 0) to N new bnx files of about the same size, <prefix>_Shard01.bnx ..., instead of one per scan, for example to give each cluster node the same amount of work. Each shard has whole runIDs (or whole scans, --shardAlign scan) in the order of the bnx file, and the number of molecules of the shard in its header. The shards are listed in <prefix>_shards.txt. default=0 (no shards)",type=int,default=0)
+    parser.add_argument("--shardBy", help="balance shards by number of molecules (molecules) or by bytes of the molecules in the bnx file (bytes), which grows with the total length of the molecules. default=molecules",type=str,default='molecules',choices=['molecules','bytes'])
+    parser.add_argument("--shardAlign", help="shards have whole runIDs (runID) or whole scans (scan). default=runID",type=str,default='runID',choices=['runID','scan'])
+    parser.add_argument("--follow", help="live mode: if --follow 1, split the bnx file while the instrument is still writing it. The bnx file is read every --pollSeconds seconds, and the new bnx file of a scan is written as soon as the next scan starts. The run ends when the bnx file did not grow for --idleSeconds seconds. The bnx file must not be compressed. default=0",type=int,default=0)
+    parser.add_argument("--pollSeconds", help="live mode: seconds between reads of the bnx file. default=30",type=float,default=30)
+    parser.add_argument("--idleSeconds", help="live mode: the run is finished when the bnx file did not grow for this many seconds. default=1800",type=float,default=1800)
+    parser.add_argument("--checkpoint", help="live mode: checkpoint file, written after each read of the bnx file. A restarted run continues from the checkpoint file instead of reading the bnx file again. default = <prefix>_live_checkpoint.json",type=str,default='')
+    parser.add_argument("--merge", help="merge mode: if --merge 1, write the molecules of the selected scans (all scans with -s 1, the -r scans with -s 0) of all bnx files (-b and --manifest, for example of a restarted run of the same chip) to one new bnx file, <prefix>_merged.bnx or <prefix>_ScanRange_..._merged.bnx, with one header, the total number of molecules, molecule IDs numbered from 1 and the runIDs of each next bnx file increased so that they are unique (listed in <prefix>_merged_runIDs.txt). Each bnx file is read once, up to --jobs and --maxIO at the same time, with spool files in --spoolDir. default=0",type=int,default=0)
+    parser.add_argument("--stats", help="write run time statistics as JSON to this file ('-' for stdout): wall and CPU time of each step, bytes read and written, molecules per second, peak memory, number of open output files. In batch mode, a list with the statistics of each bnx file. default = '' (no statistics)",type=str,default='')
+    parser.add_argument("--progress", help="print a progress report to stderr every --progress seconds while reading the bnx file. default=0 (no progress reports)",type=float,default=0)
+    parser.add_argument("--profile", help="run with cProfile and write the profile to this file, for example to read with python -m pstats. default = '' (no profile)",type=str,default='')
+    parser.add_argument("--cacheDir", help="directory for index cache files if --indexCache 1. default = next to the bnx file, <bnxFile>.scanIndex.json",type=str,default='')
+
+    return parser
+
+
+#function returns the stream for the messages of a run: stderr if the statistics are written to stdout (--stats -),
+#so that stdout has only the JSON of the statistics.
+def messageStream(statsFile):
+    if statsFile == '-':
+        return sys.stderr
+    return sys.stdout
+
+
+#function runs the command line with arguments argv (default sys.argv[1:]).
+def main(argv=None):
+    parser = buildParser()
+    args = parser.parse_args(argv)
+
+    #jobList: list of [bnxFile,prefix] of each bnx file to split.
+    jobList = [[b,''] for b in args.bnxFile]
+    if len(args.manifest) > 0:
+        jobList += readManifest(args.manifest)
+    if len(jobList) == 0:
+        parser.error('no bnx file given, use -b or --manifest')
+
+    #Check: If -s 0, code expects a value for -r. If not value give for -r exit code and print warning.
+    if args.byScan == 0 and len(args.scanRange) == 0:
+        print()
+        print()
+        print('#### WARNING: You have selected to print bnx for range of scan numbers (-s 0), but have not given a range of scan numbers (-r '+args.scanRange+'). This is incompatible. If you select -s 0, then you must give a range of scan numbers (-r). For example: -r 1-10')
+        return
+
+    #Check: If -s 1, then code will print a bnx file for each scan number. There should be no value for -r. 
+    if args.byScan == 1 and len(args.scanRange) > 0:
+        print()
+        print()
+        print('#### WARNING: You have selected to print a bnx file for each scan number (-s 1), but also given a range of scan numbers (-r '+args.scanRange+'). This is incompatible. If you select -s 1, then you can not select a range of scan numbers (-r) as well.')
+        return
+
+    #selection: None for a bnx file for each scan number, else the range of scan numbers.
+    selection = None
+    if args.byScan == 0:
+        selection = args.scanRange
+
+    #filters: None if no molecule filter is given. numpy is only imported if filters are used.
+    filters = None
+    if args.minLength > 0 or args.minLabels > 0 or args.minSNR > 0 or args.minIntensity > 0 or len(args.excludeColID) > 0 or len(args.excludeRunID) > 0:
+        from .filters import makeFilters,parseIDList
+        filters = makeFilters(args.minLength,args.minLabels,args.minSNR,args.minIntensity,parseIDList(args.excludeColID),parseIDList(args.excludeRunID))
+
+    #live mode: one bnx file, split while it is written.
+    if args.follow == 1:
+        if len(jobList) > 1 or len(args.manifest) > 0:
+            parser.error('--follow 1 splits one bnx file, give one -b and no --manifest')
+        if filters is not None:
+            parser.error('molecule filters can not be used with --follow 1')
+        if args.shards > 0:
+            parser.error('--shards can not be used with --follow 1')
+        if args.engine != 'lines':
+            parser.error('--engine can not be used with --follow 1')
+        if len(args.stats) > 0:
+            parser.error('--stats can not be used with --follow 1')
+        if args.singlePass == 1:
+            parser.error('--singlePass can not be used with --follow 1')
+        if args.indexCache == 1:
+            parser.error('--indexCache can not be used with --follow 1')
+        if args.columnar == 1:
+            parser.error('--columnar can not be used with --follow 1')
+        if args.copyBlocks == 0:
+            parser.error('--copyBlocks 0 can not be used with --follow 1')
+        if args.maxOpenFiles != parser.get_default('maxOpenFiles') or args.outputBufferMB != parser.get_default('outputBufferMB'):
+            parser.error('--maxOpenFiles and --outputBufferMB can not be used with --follow 1')
+        if args.progress > 0 or len(args.profile) > 0:
+            parser.error('--progress and --profile can not be used with --follow 1')
+        follow_bnx(jobList[0][0],selection,args.prefix,args.checkpoint,args.pollSeconds,args.idleSeconds,
+                   compress=args.compressOutput,threads=args.threads,verbose=True)
+        return
+
+    #merge mode: all bnx files to one new bnx file, manifest prefixes are not used.
+    if args.merge == 1:
+        if filters is not None or args.shards > 0:
+            parser.error('molecule filters and --shards can not be used with --merge 1')
+        if len(args.stats) > 0:
+            parser.error('--stats can not be used with --merge 1')
+        if args.engine != 'lines':
+            parser.error('--engine can not be used with --merge 1')
+        if args.columnar == 1 or args.indexCache == 1:
+            parser.error('--columnar and --indexCache can not be used with --merge 1')
+        if args.progress > 0 or len(args.profile) > 0:
+            parser.error('--progress and --profile can not be used with --merge 1')
+        merge_bnx([j[0] for j in jobList],selection,args.prefix,args.threads,args.jobs,args.maxIO,args.spoolDir,args.compressOutput,verbose=True)
+        return
+
+    #shards are written from the bnx file, not from a columnar directory, and without filters.
+    if args.shards > 0 and (filters is not None or args.columnar == 1 or any(os.path.isdir(j[0]) for j in jobList)):
+        parser.error('--shards can not be used with molecule filters, --columnar 1 or a columnar directory')
+
+    splitOptions = {'threads':args.threads,'singlePass':args.singlePass == 1,'spoolDir':args.spoolDir,'copyBlocks':args.copyBlocks == 1,
+                    'compress':args.compressOutput,'indexCache':args.indexCache == 1,'cacheDir':args.cacheDir,'columnar':args.columnar == 1,'filters':filters,
+                    'maxOpenFiles':args.maxOpenFiles,'outputBufferMB':args.outputBufferMB,'engine':args.engine,
+                    'numShards':args.shards,'shardBy':args.shardBy,'shardAlign':args.shardAlign}
+
+    #one bnx file, -p is the prefix.
+    if len(jobList) == 1 and len(args.manifest) == 0:
+        #stats: collect run time statistics if --stats or --progress.
+        stats = None
+        if len(args.stats) > 0 or args.progress > 0:
+            stats = RunStats(args.progress)
+
+        with contextlib.redirect_stdout(messageStream(args.stats)):
+            if len(args.profile) > 0:
+                result = runProfiled(args.profile,split_by_scan,jobList[0][0],selection,args.prefix,verbose=True,stats=stats,**splitOptions)
+            else:
+                result = split_by_scan(jobList[0][0],selection,args.prefix,verbose=True,stats=stats,**splitOptions)
+
+        if len(args.stats) > 0:
+            writeStats(result['stats'],args.stats)
+        return
+
+    #batch mode: each bnx file gets its own prefix. split bnx files in a pool of processes, then print combined summary.
+    if args.progress > 0 or len(args.profile) > 0:
+        parser.error('--progress and --profile can not be used with more than one bnx file')
+    jobList = assignPrefixes(jobList,args.prefix)
+    numWorkers = batchWorkers(len(jobList),args.jobs,args.maxIO,args.threads)
+    with contextlib.redirect_stdout(messageStream(args.stats)):
+        print('Splitting '+str(len(jobList))+' BNX Files, '+str(numWorkers)+' at a time')
+
+        summaryList = splitBatch(jobList,selection,splitOptions,numWorkers,len(args.stats) > 0)
+        printBatchSummary(summaryList,args.prefix)
+
+    if len(args.stats) > 0:
+        writeStats([s['stats'] for s in summaryList],args.stats)
+
+    #exit code 1 if any bnx file failed.
+    for s in summaryList:
+        if s['status'] != 'ok':
+            return 1
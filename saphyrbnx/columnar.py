@@ -0,0 +1,418 @@
+# Columnar cache of a bnx file: the bnx file is converted once to a directory of numpy arrays that can be memory mapped,
+# then split by scan many times with vectorized masks over the runID column instead of reading each line.
+#
+# the columnar directory <bnxFile>.columnar has:
+#   columnar.json          version, key of the bnx file (see indexCacheKey), header lines and their byte offsets in
+#                          records.bin, runIDList, column names
+#   records.bin            raw bytes of each molecule (0 line and its 1, 2, QX lines), exactly as in the bnx file
+#   recordOffsets.npy      byte offset of each molecule in records.bin, numMolecules+1 values
+#   <column>.npy           fields of the 0 line, one value per molecule, see MOLECULE_COLUMNS
+#   values_<code>.npy      values of the 1, 2, QX11, QX12, QX21, QX22 lines of all molecules, one flat array per code
+#   offsets_<code>.npy     offset of the values of each molecule in values_<code>.npy, numMolecules+1 values
+import os
+import json
+import mmap
+import shutil
+import hashlib
+from array import array
+
+import numpy as np
+
+from .bnxio import openBNXFile,hasCRLF,copyByteRange
+from .index import indexCacheKey
+from .split import generateFileNames,openFiles,writeTitle
+
+COLUMNAR_VERSION = 2
+
+#fields of the 0 line kept as columns: name, index of field in 0 line, numpy dtype.
+MOLECULE_COLUMNS = [['moleculeID',1,'i8'],['length',2,'f8'],['avgIntensity',3,'f8'],['SNR',4,'f8'],
+                    ['numLabels',5,'i8'],['runID',11,'i8'],['colID',12,'i8']]
+
+#line codes of the values of each molecule, the names of the value files are values_<code>.npy and offsets_<code>.npy.
+VALUE_CODES = [b'1',b'2',b'QX11',b'QX12',b'QX21',b'QX22']
+
+#number of molecules whose 1, 2, QX values are parsed at a time while converting.
+CONVERT_BATCH = 50000
+
+
+#function returns the columnar directory of bnx file filename: <bnxFile>.columnar, or a directory in cacheDir.
+def columnarDirName(filename,cacheDir=''):
+    if len(cacheDir) == 0:
+        return filename+'.columnar'
+
+    pathSum = hashlib.md5(os.path.abspath(filename).encode()).hexdigest()[0:12]
+    return os.path.join(cacheDir,os.path.basename(filename)+'_'+pathSum+'.columnar')
+
+
+#function returns True if path is a columnar directory.
+def isColumnar(path):
+    return os.path.isfile(os.path.join(path,'columnar.json'))
+
+
+#function returns True if columnarDir is a columnar directory of the current version of bnx file filename.
+def columnarUpToDate(filename,columnarDir):
+    if not isColumnar(columnarDir):
+        return False
+
+    try:
+        infile = open(os.path.join(columnarDir,'columnar.json'),'r')
+        meta = json.load(infile)
+        infile.close()
+    except (OSError,ValueError):
+        return False
+
+    return meta.get('version') == COLUMNAR_VERSION and meta.get('key') == indexCacheKey(filename)
+
+
+#function writes numpy file npyFile with the raw values in file rawFile, length values of dtype, and removes rawFile.
+def rawToNpy(rawFile,npyFile,dtype,length):
+    outfile = open(npyFile,'wb')
+    np.lib.format.write_array_header_1_0(outfile,{'descr':np.dtype(dtype).str,'fortran_order':False,'shape':(length,)})
+    infile = open(rawFile,'rb')
+    shutil.copyfileobj(infile,outfile,16*1024*1024)
+    infile.close()
+    outfile.close()
+    os.remove(rawFile)
+
+
+#function converts bnx file filename to columnar directory columnarDir, see top of file.
+#header lines are kept with their byte offset in records.bin, so that they are exported at the same place, also a header
+#line between the 0 line of a molecule and its other lines.
+#lines that are not header lines or lines of a molecule are skipped, the same as readBNXFile.
+#the directory is written as columnarDir.tmp and renamed at the end. returns columnarDir.
+def convert_to_columnar(filename,columnarDir='',threads=1):
+    filename = os.fspath(filename)
+    if len(columnarDir) == 0:
+        columnarDir = columnarDirName(filename)
+
+    tmpDir = columnarDir+'.tmp'
+    if os.path.exists(tmpDir):
+        shutil.rmtree(tmpDir)
+    os.makedirs(tmpDir)
+
+    crlf = hasCRLF(filename)
+    key = indexCacheKey(filename)
+    infile = openBNXFile(filename,threads)
+    records = open(os.path.join(tmpDir,'records.bin'),'wb')
+
+    #header: header lines. headerOffset: byte offset in records.bin of each header line. runIDList as in findNumberColumnsPerBank.
+    header = []
+    headerOffset = []
+    runIDList = []
+
+    #recordOffsets: byte offset of each molecule in records.bin. columnHash: values of each 0 line column.
+    recordOffsets = array('q',[0])
+    columnHash = {}
+    for name,index,dtype in MOLECULE_COLUMNS:
+        columnHash[name] = array('q' if dtype == 'i8' else 'd')
+
+    #valueHash: for each code, value fields of lines not parsed yet. countHash: number of values of each molecule.
+    #valueFiles: raw files of parsed values. numValues: number of values written of each code.
+    valueHash = {}
+    countHash = {}
+    valueFiles = {}
+    numValues = {}
+    for code in VALUE_CODES:
+        valueHash[code] = []
+        countHash[code] = array('q')
+        valueFiles[code] = open(os.path.join(tmpDir,'values_'+code.decode()+'.raw'),'wb')
+        numValues[code] = 0
+
+    numMolecules = 0
+    offset = 0
+    inMolecule = False
+
+    for line in infile:
+        if crlf:
+            line = line.replace(b'\r\n',b'\n')
+
+        if line[0:1] == b'#':
+            header.append(line.decode('latin-1'))    #latin-1 keeps each byte of the header line.
+            headerOffset.append(offset)
+
+            #if the line begins with '# Run Data', pull out runID value.
+            if line[0:10] == b'# Run Data':
+                runIDList.append(int(line.strip().split(b'\t')[-1]))
+            continue
+
+        if line[0:1] == b'0':
+            #end of previous molecule. parse values of a batch of molecules.
+            if inMolecule:
+                recordOffsets.append(offset)
+                if numMolecules % CONVERT_BATCH == 0:
+                    flushValues(valueHash,valueFiles,numValues)
+            inMolecule = True
+            numMolecules += 1
+
+            word = line.split()
+            for name,index,dtype in MOLECULE_COLUMNS:
+                if dtype == 'i8':
+                    columnHash[name].append(int(word[index]))
+                else:
+                    columnHash[name].append(float(word[index]))
+            for code in VALUE_CODES:
+                countHash[code].append(0)
+
+        elif inMolecule and (line[0:1] == b'1' or line[0:1] == b'2' or line[0:4] in (b'QX11',b'QX12',b'QX21',b'QX22')):
+            code = line[0:4] if line[0:2] == b'QX' else line[0:1]
+            word = line.split()
+            valueHash[code].extend(word[1:])
+            countHash[code][-1] += len(word)-1
+
+        else:   #not a line of a molecule, skipped.
+            continue
+
+        records.write(line)
+        offset += len(line)
+
+    if inMolecule:
+        recordOffsets.append(offset)
+    flushValues(valueHash,valueFiles,numValues)
+
+    infile.close()
+    records.close()
+
+    #write numpy files of columns, offsets and values.
+    np.save(os.path.join(tmpDir,'recordOffsets.npy'),np.frombuffer(recordOffsets,dtype=np.int64))
+    for name,index,dtype in MOLECULE_COLUMNS:
+        np.save(os.path.join(tmpDir,name+'.npy'),np.frombuffer(columnHash[name],dtype=dtype))
+
+    for code in VALUE_CODES:
+        valueFiles[code].close()
+        name = code.decode()
+        rawToNpy(os.path.join(tmpDir,'values_'+name+'.raw'),os.path.join(tmpDir,'values_'+name+'.npy'),'f8',numValues[code])
+
+        offsets = np.zeros(numMolecules+1,dtype=np.int64)
+        np.cumsum(np.frombuffer(countHash[code],dtype=np.int64),out=offsets[1:])
+        np.save(os.path.join(tmpDir,'offsets_'+name+'.npy'),offsets)
+
+    meta = {'version':COLUMNAR_VERSION,'key':key,'bnxFile':os.path.abspath(filename),'numMolecules':numMolecules,
+            'header':header,'headerOffset':headerOffset,'runIDList':runIDList,
+            'columns':[c[0] for c in MOLECULE_COLUMNS],'valueCodes':[c.decode() for c in VALUE_CODES]}
+    outfile = open(os.path.join(tmpDir,'columnar.json'),'w')
+    json.dump(meta,outfile)
+    outfile.close()
+
+    if os.path.exists(columnarDir):
+        shutil.rmtree(columnarDir)
+    os.rename(tmpDir,columnarDir)
+
+    return columnarDir
+
+
+#function parses value fields in valueHash of each code to float64, appends them to the raw file of the code, and empties valueHash.
+def flushValues(valueHash,valueFiles,numValues):
+    for code in VALUE_CODES:
+        if len(valueHash[code]) > 0:
+            valueFiles[code].write(np.array(valueHash[code],dtype=np.float64).tobytes())
+            numValues[code] += len(valueHash[code])
+            valueHash[code] = []
+
+
+#class opens a columnar directory. arrays are memory mapped, so only the parts that are used are read from disk.
+#columns: dict of 0 line columns (see MOLECULE_COLUMNS). values(code): flat values and offsets of the 1, 2 or QX lines.
+class ColumnarBNX(object):
+    def __init__(self,columnarDir):
+        self.columnarDir = columnarDir
+
+        infile = open(os.path.join(columnarDir,'columnar.json'),'r')
+        meta = json.load(infile)
+        infile.close()
+        if meta.get('version') != COLUMNAR_VERSION:
+            raise ValueError('columnar directory '+columnarDir+' has version '+str(meta.get('version'))+', expected '+str(COLUMNAR_VERSION))
+
+        self.numMolecules = meta['numMolecules']
+        self.header = [h.encode('latin-1') for h in meta['header']]
+        self.headerOffset = meta['headerOffset']
+        self.runIDList = meta['runIDList']
+        self.recordOffsets = np.load(os.path.join(columnarDir,'recordOffsets.npy'),mmap_mode='r')
+
+        self.columns = {}
+        for name in meta['columns']:
+            self.columns[name] = np.load(os.path.join(columnarDir,name+'.npy'),mmap_mode='r')
+
+    #values of the line that begins with code ('1', '2', 'QX11', 'QX12', 'QX21' or 'QX22') of all molecules, and offsets:
+    #the values of molecule i are values[offsets[i]:offsets[i+1]].
+    def values(self,code):
+        values = np.load(os.path.join(self.columnarDir,'values_'+code+'.npy'),mmap_mode='r')
+        offsets = np.load(os.path.join(self.columnarDir,'offsets_'+code+'.npy'),mmap_mode='r')
+        return values,offsets
+
+    #function returns maxColID,runIDList,runIDMaxColHash,molNumPerRunID, the same as findNumberColumnsPerBank,
+    #computed from the runID and colID columns.
+    def scanIndex(self):
+        runID = self.columns['runID']
+        colID = self.columns['colID']
+
+        #runIDMaxColHash: 0 for each runID of '# Run Data' lines, then maximum colID of molecules of each runID.
+        runIDMaxColHash = {}
+        for r in self.runIDList:
+            runIDMaxColHash[str(r)] = 0
+
+        molNumPerRunID = {}
+        maxColID = 0
+        if self.numMolecules > 0:
+            uniqueRunID,inverse = np.unique(runID,return_inverse=True)
+            counts = np.bincount(inverse,minlength=len(uniqueRunID))
+            maxCol = np.zeros(len(uniqueRunID),dtype=np.int64)
+            np.maximum.at(maxCol,inverse,colID)
+
+            for i in range(0,len(uniqueRunID)):
+                r = str(uniqueRunID[i])
+                if r not in runIDMaxColHash:
+                    raise KeyError('runID '+r+' of a molecule has no # Run Data line')
+                molNumPerRunID[r] = int(counts[i])
+                runIDMaxColHash[r] = max(runIDMaxColHash[r],int(maxCol[i]))
+            maxColID = max(0,int(colID.max()))
+
+        return maxColID,list(self.runIDList),runIDMaxColHash,molNumPerRunID
+
+    #function returns scan number of each molecule as numpy array, from runIDToScanHash (see groupRunIDByScan).
+    def scanColumn(self,runIDToScanHash):
+        uniqueRunID,inverse = np.unique(self.columns['runID'],return_inverse=True)
+        scanOfRunID = np.array([runIDToScanHash[str(r)][0] for r in uniqueRunID],dtype=np.int64)
+        return scanOfRunID[inverse]
+
+
+#function writes new bnx files from columnar bnx, columnar, the same as readBNXFile.
+#slot: numpy array with the index of the output file of each molecule, -1 if the molecule is not written.
+#outputFiles: list of open file objects, one for each slot. header lines are written with writeHeader(line)
+#at the same place as in the bnx file. molecules of each output file are copied from records.bin as contiguous ranges.
+#returns the number of bytes copied from records.bin.
+def writeColumnarFiles(columnar,slot,outputFiles,writeHeader):
+    recordsFile = open(os.path.join(columnar.columnarDir,'records.bin'),'rb')
+    mm = None
+    if os.fstat(recordsFile.fileno()).st_size > 0:
+        mm = mmap.mmap(recordsFile.fileno(),0,access=mmap.ACCESS_READ)
+
+    #bytes of records.bin between header lines: a header line at offset o is written after the bytes before o.
+    position = 0
+    bytesRead = 0
+    for h in range(0,len(columnar.header)):
+        bytesRead += writeBytes(columnar,slot,outputFiles,recordsFile,mm,position,columnar.headerOffset[h])
+        position = columnar.headerOffset[h]
+        writeHeader(columnar.header[h])
+    bytesRead += writeBytes(columnar,slot,outputFiles,recordsFile,mm,position,int(columnar.recordOffsets[-1]))
+
+    if mm is not None:
+        mm.close()
+    recordsFile.close()
+
+    return bytesRead
+
+
+#function copies bytes start to end of records.bin to the output files of their molecules. start and end are at the
+#beginning of a molecule, or inside a molecule if a header line is between its 0 line and its other lines: the part of
+#that molecule is copied on its own. returns the number of bytes copied.
+def writeBytes(columnar,slot,outputFiles,recordsFile,mm,start,end):
+    if end <= start:
+        return 0
+
+    offsets = columnar.recordOffsets
+    bytesRead = 0
+
+    #rest of the molecule of byte start, after a header line.
+    first = int(np.searchsorted(offsets,start,'right'))-1
+    if offsets[first] < start:
+        partEnd = min(end,int(offsets[first+1]))
+        bytesRead += writePart(slot,outputFiles,recordsFile,mm,first,start,partEnd)
+        start = partEnd
+        first += 1
+    if start >= end:
+        return bytesRead
+
+    #whole molecules, then the beginning of the molecule of byte end, before a header line.
+    last = int(np.searchsorted(offsets,end,'right'))-1
+    bytesRead += writeSegment(columnar,slot,outputFiles,recordsFile,mm,first,last)
+    if offsets[last] < end:
+        bytesRead += writePart(slot,outputFiles,recordsFile,mm,last,int(offsets[last]),end)
+
+    return bytesRead
+
+
+#function copies molecules start to end of each slot to its output file, as contiguous ranges of records.bin.
+#returns the number of bytes copied.
+def writeSegment(columnar,slot,outputFiles,recordsFile,mm,start,end):
+    if end <= start:
+        return 0
+
+    bytesRead = 0
+    segmentSlot = np.asarray(slot[start:end])
+    for i in range(0,len(outputFiles)):
+        index = np.flatnonzero(segmentSlot == i)+start
+        if len(index) == 0:
+            continue
+
+        #ranges of consecutive molecules: break where the next index is not index+1.
+        breaks = np.flatnonzero(np.diff(index) != 1)
+        rangeStart = np.concatenate(([index[0]],index[breaks+1]))
+        rangeEnd = np.concatenate((index[breaks],[index[-1]]))+1
+
+        for s,e in zip(columnar.recordOffsets[rangeStart],columnar.recordOffsets[rangeEnd]):
+            copyByteRange(recordsFile,mm,outputFiles[i],int(s),int(e))
+            bytesRead += int(e)-int(s)
+
+    return bytesRead
+
+
+#function copies bytes start to end of records.bin, part of molecule i, to the output file of slot i. returns the number of bytes copied.
+def writePart(slot,outputFiles,recordsFile,mm,i,start,end):
+    if slot[i] < 0:
+        return 0
+
+    copyByteRange(recordsFile,mm,outputFiles[int(slot[i])],start,end)
+    return end-start
+
+
+#function writes new bnx files from columnar bnx, columnar, the same as readBNXFile writes them from the bnx file.
+#the scan number of each molecule is found from the runID column, and molecules of scan numbers that are not written
+#are masked out. if mask is given (numpy bool array, see columnarFilterMask), only molecules where mask is True are written.
+#returns the number of bytes copied from records.bin.
+def splitColumnar(sValue,numMolPerFile,scanHash,runIDToScanHash,columnar,prefix,compress='',threads=1,opener=None,mask=None):
+    #generate hash of new bnx file names based on user input.
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+
+    #openFiles function: adds open files object to a hash openFileHash
+    openFileHash = openFiles(sValue,filenameHash,compress,threads,opener)
+
+    #outputFiles: each open file once (if sValue = 0, all scan numbers have the same file). slotOfScan: index in outputFiles of each scan number.
+    outputFiles = []
+    slotOfScan = {}
+    for s in openFileHash:
+        if openFileHash[s] not in outputFiles:
+            outputFiles.append(openFileHash[s])
+        slotOfScan[int(s)] = outputFiles.index(openFileHash[s])
+
+    #slot of each molecule: from scan number of its runID, -1 if scan number not written.
+    slot = np.full(columnar.numMolecules,-1,dtype=np.int64)
+    if columnar.numMolecules > 0:
+        scan = columnar.scanColumn(runIDToScanHash)
+        for s in slotOfScan:
+            slot[scan == s] = slotOfScan[s]
+        if mask is not None:
+            slot[~np.asarray(mask)] = -1
+
+    bytesRead = writeColumnarFiles(columnar,slot,outputFiles,lambda line: writeTitle(line,openFileHash,sValue,numMolPerFile))
+
+    for f in outputFiles:
+        f.close()     #close each file.
+
+    return bytesRead
+
+
+#function writes molecules of columnar bnx, columnar, where mask is True (all molecules if mask is None) to open file outfile
+#as exact bnx text, with all header lines. the number of molecules in the header is the number of molecules written.
+def export_bnx(columnar,outfile,mask=None):
+    if mask is None:
+        slot = np.zeros(columnar.numMolecules,dtype=np.int64)
+    else:
+        slot = np.where(np.asarray(mask),0,-1)
+    numMolecules = int(np.count_nonzero(slot == 0))
+
+    def writeHeader(line):
+        if line[0:22] == b'# Number of Molecules:':
+            outfile.write(b'# Number of Molecules:\t'+str(numMolecules).encode()+b'\n')
+        else:
+            outfile.write(line)
+
+    writeColumnarFiles(columnar,slot,[outfile],writeHeader)
@@ -0,0 +1,333 @@
+# Molecule quality filters applied while splitting: minimum length, minimum number of labels, minimum mean label SNR
+# and intensity, and colID and runID values to exclude. The filters are evaluated with numpy on batches of molecules.
+import os
+import io
+
+import numpy as np
+
+from .bnxio import openBNXFile,hasCRLF
+from .scans import computeNumMoleculesPerBNX
+from .split import generateFileNames,openFiles,writeTitle
+
+#number of molecules evaluated at a time.
+FILTER_BATCH = 50000
+
+
+#function parses a list of IDs such as '1,4,10-12' to a set of ints.
+def parseIDList(strIDs):
+    ids = set()
+    for part in strIDs.split(','):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        if '-' in part:
+            first,last = part.split('-')
+            ids.update(range(int(first),int(last)+1))
+        else:
+            ids.add(int(part))
+
+    return ids
+
+
+#function returns dict of molecule filters, or None if no filter is set (all values 0 or empty).
+#minLength: minimum molecule length (field 2 of the 0 line). minLabels: minimum number of labels (field 5 of the 0 line).
+#minSNR, minIntensity: minimum mean SNR (QX11 and QX21 lines) and mean intensity (QX12 and QX22 lines) of the labels
+#of the molecule, both colors together. a molecule without labels has mean 0.
+#excludeColID, excludeRunID: colID and runID values (ints) of molecules that are not written.
+def makeFilters(minLength=0,minLabels=0,minSNR=0,minIntensity=0,excludeColID=(),excludeRunID=()):
+    filters = {'minLength':float(minLength),'minLabels':int(minLabels),'minSNR':float(minSNR),'minIntensity':float(minIntensity),
+               'excludeColID':sorted(set(int(c) for c in excludeColID)),'excludeRunID':sorted(set(int(r) for r in excludeRunID))}
+
+    if (filters['minLength'] <= 0 and filters['minLabels'] <= 0 and filters['minSNR'] <= 0 and filters['minIntensity'] <= 0
+            and len(filters['excludeColID']) == 0 and len(filters['excludeRunID']) == 0):
+        return None
+
+    return filters
+
+
+#function returns numpy bool array, True for each molecule that passes filters.
+#arguments are numpy arrays with a value for each molecule. snrSum, snrCount: sum and number of SNR values of the labels,
+#intensitySum, intensityCount: the same for intensity values. they are only used if minSNR or minIntensity is set.
+def filterMask(filters,length,numLabels,runID,colID,snrSum,snrCount,intensitySum,intensityCount):
+    mask = np.ones(len(length),dtype=bool)
+
+    if filters['minLength'] > 0:
+        mask &= length >= filters['minLength']
+    if filters['minLabels'] > 0:
+        mask &= numLabels >= filters['minLabels']
+    if filters['minSNR'] > 0:
+        mask &= snrSum >= filters['minSNR']*np.maximum(snrCount,1)
+        mask &= snrCount > 0
+    if filters['minIntensity'] > 0:
+        mask &= intensitySum >= filters['minIntensity']*np.maximum(intensityCount,1)
+        mask &= intensityCount > 0
+    if len(filters['excludeColID']) > 0:
+        mask &= ~np.isin(colID,filters['excludeColID'])
+    if len(filters['excludeRunID']) > 0:
+        mask &= ~np.isin(runID,filters['excludeRunID'])
+
+    return mask
+
+
+#function returns sums and counts of values of each molecule from flat values and offsets (see ColumnarBNX.values).
+def sumPerMolecule(values,offsets):
+    cumsum = np.concatenate(([0.0],np.cumsum(values,dtype=np.float64)))
+    offsets = np.asarray(offsets)
+    return cumsum[offsets[1:]]-cumsum[offsets[:-1]],np.diff(offsets)
+
+
+#function returns filter mask of each molecule of columnar bnx, columnar (see columnar.py), from its columns and value arrays.
+def columnarFilterMask(columnar,filters):
+    numMolecules = columnar.numMolecules
+    snrSum = snrCount = intensitySum = intensityCount = np.zeros(numMolecules)
+
+    if filters['minSNR'] > 0:
+        s1,c1 = sumPerMolecule(*columnar.values('QX11'))
+        s2,c2 = sumPerMolecule(*columnar.values('QX21'))
+        snrSum,snrCount = s1+s2,c1+c2
+    if filters['minIntensity'] > 0:
+        s1,c1 = sumPerMolecule(*columnar.values('QX12'))
+        s2,c2 = sumPerMolecule(*columnar.values('QX22'))
+        intensitySum,intensityCount = s1+s2,c1+c2
+
+    return filterMask(filters,columnar.columns['length'],columnar.columns['numLabels'],columnar.columns['runID'],
+                      columnar.columns['colID'],snrSum,snrCount,intensitySum,intensityCount)
+
+
+#function returns molNumPerRunID of the molecules that pass the filters: keys of molNumPerRunID, number of molecules
+#of runID runID (numpy array, one value per molecule) where mask is True.
+def countPerRunID(molNumPerRunID,runID,mask):
+    filteredMolNumPerRunID = dict.fromkeys(molNumPerRunID,0)
+
+    uniqueRunID,counts = np.unique(np.asarray(runID)[mask],return_counts=True)
+    for r,n in zip(uniqueRunID,counts):
+        filteredMolNumPerRunID[str(r)] = int(n)
+
+    return filteredMolNumPerRunID
+
+
+#generator reads bnx file filename and yields ('#',line) for each header line and ('0',batch) for each batch of molecules,
+#in order of the file. batch is the tuple (raws,runID,mask): raw bytes of each molecule, numpy array of runIDs, and
+#filter mask. lines that are not header lines or lines of a molecule are skipped, the same as readBNXFile.
+#if progress is given, progress(numMolecules) is called after each batch.
+def iterFilteredBatches(filename,filters,threads=1,progress=None):
+    crlf = hasCRLF(filename)
+    infile = openBNXFile(filename,threads)
+
+    #QX values are only parsed if needed.
+    parseSNR = filters['minSNR'] > 0
+    parseIntensity = filters['minIntensity'] > 0
+
+    #batch: raw lines of each molecule and 0 line fields. snr, intensity: value fields of the batch, and number per molecule.
+    raws = []
+    lines = None
+    fields = []
+    snrValues = []
+    snrCount = []
+    intensityValues = []
+    intensityCount = []
+    numMolecules = 0
+
+    for line in infile:
+        if crlf:
+            line = line.replace(b'\r\n',b'\n')
+
+        if line[0:1] == b'0' or line[0:1] == b'#':
+            #end of previous molecule.
+            if lines is not None:
+                raws.append(b''.join(lines))
+                lines = None
+
+            #batch is full, or header line: evaluate filters of batch.
+            if len(raws) > 0 and (line[0:1] == b'#' or len(raws) >= FILTER_BATCH):
+                yield '0',evaluateBatch(filters,raws,fields,snrValues,snrCount,intensityValues,intensityCount)
+                numMolecules += len(raws)
+                if progress is not None:
+                    progress(numMolecules)
+                raws,fields,snrValues,snrCount,intensityValues,intensityCount = [],[],[],[],[],[]
+
+            if line[0:1] == b'#':
+                yield '#',line
+            else:
+                word = line.split()
+                fields.append((float(word[2]),int(word[5]),int(word[11]),int(word[12])))
+                snrCount.append(0)
+                intensityCount.append(0)
+                lines = [line]
+
+        elif lines is not None and (line[0:1] == b'1' or line[0:1] == b'2' or line[0:4] in (b'QX11',b'QX12',b'QX21',b'QX22')):
+            lines.append(line)
+
+            if parseSNR and (line[0:4] == b'QX11' or line[0:4] == b'QX21'):
+                word = line.split()
+                snrValues.extend(word[1:])
+                snrCount[-1] += len(word)-1
+            elif parseIntensity and (line[0:4] == b'QX12' or line[0:4] == b'QX22'):
+                word = line.split()
+                intensityValues.extend(word[1:])
+                intensityCount[-1] += len(word)-1
+
+    infile.close()
+
+    if lines is not None:
+        raws.append(b''.join(lines))
+    if len(raws) > 0:
+        yield '0',evaluateBatch(filters,raws,fields,snrValues,snrCount,intensityValues,intensityCount)
+        if progress is not None:
+            progress(numMolecules+len(raws))
+
+
+#function evaluates filters on a batch of molecules, see iterFilteredBatches. returns (raws,runID,mask).
+def evaluateBatch(filters,raws,fields,snrValues,snrCount,intensityValues,intensityCount):
+    fieldArray = np.array(fields,dtype=np.float64).reshape(-1,4)
+    runID = fieldArray[:,2].astype(np.int64)
+
+    snrSum,snrCount = sumPerMolecule(np.array(snrValues,dtype=np.float64),np.concatenate(([0],np.cumsum(snrCount))))
+    intensitySum,intensityCount = sumPerMolecule(np.array(intensityValues,dtype=np.float64),np.concatenate(([0],np.cumsum(intensityCount))))
+
+    mask = filterMask(filters,fieldArray[:,0],fieldArray[:,1],runID,fieldArray[:,3].astype(np.int64),
+                      snrSum,snrCount,intensitySum,intensityCount)
+
+    return raws,runID,mask
+
+
+#function reads bnx file and writes the molecules that pass filters to new bnx files, the same as readBNXFile.
+#the number of molecules in the header of each new bnx file is the number after filtering:
+#if the new bnx files are plain files, the '# Number of Molecules:' line is written with spaces in place of the number, as
+#wide as the number before filtering. at the end the filtered number is written over the spaces, and the spaces left
+#after it are removed from the file.
+#else (compressed files, or files of a sink function), the bnx file is read once first to count the molecules that pass the filters.
+#returns bytes read from the bnx file, molNumPerRunID and numMolPerFile after filtering.
+def filterBNXFile(sValue,numMolPerFile,scanHash,runIDToScanHash,runIDList,molNumPerRunID,filename,prefix,filters,compress='',threads=1,opener=None,progress=None):
+    #generate hash of new bnx file names based on user input. openFiles function: adds open files object to a hash openFileHash
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+    openFileHash = openFiles(sValue,filenameHash,compress,threads,opener)
+
+    #patch: True if the number in the header can be written over at the end of each new bnx file.
+    patch = True
+    for f in openFileHash.values():
+        if not (isinstance(f,io.BufferedWriter) or (hasattr(f,'canPatch') and f.canPatch())):
+            patch = False
+    bytesRead = 0
+
+    if not patch:
+        #counting pass: number of molecules of each runID that pass the filters.
+        filteredMolNumPerRunID = dict.fromkeys(molNumPerRunID,0)
+        for kind,batch in iterFilteredBatches(filename,filters,threads):
+            if kind == '0':
+                for r,n in countPerRunID({},batch[1],batch[2]).items():
+                    filteredMolNumPerRunID[r] += n
+        numMolPerFile = computeNumMoleculesPerBNX(sValue,runIDList,scanHash,runIDToScanHash,filteredMolNumPerRunID)
+        bytesRead += os.path.getsize(filename)
+
+    #patchHash: for each scan number key of the new bnx file, list of [file offset,width] of '# Number of Molecules:' lines.
+    patchHash = {}
+    scanOfRunID = {}
+    writtenMolNumPerRunID = dict.fromkeys(molNumPerRunID,0)
+
+    for kind,batch in iterFilteredBatches(filename,filters,threads,progress):
+        if kind == '#':
+            line = batch
+            if patch and line[0:22] == b'# Number of Molecules:':
+                writePaddedCount(openFileHash,sValue,numMolPerFile,patchHash)
+            else:
+                writeTitle(line,openFileHash,sValue,numMolPerFile)
+            continue
+
+        raws,runID,mask = batch
+        for i in np.flatnonzero(mask):
+            r = int(runID[i])
+            if r not in scanOfRunID:
+                scanOfRunID[r] = str(runIDToScanHash[str(r)][0])    #scan number
+            snum = scanOfRunID[r]
+
+            if snum in openFileHash:    #if scan number in openFileHash, write molecule in new bnx file.
+                openFileHash[snum].write(raws[i])
+                writtenMolNumPerRunID[str(r)] += 1
+
+    bytesRead += os.path.getsize(filename)
+
+    if patch:
+        filteredMolNumPerRunID = writtenMolNumPerRunID
+        numMolPerFile = computeNumMoleculesPerBNX(sValue,runIDList,scanHash,runIDToScanHash,filteredMolNumPerRunID)
+        cutHash = patchCounts(openFileHash,sValue,numMolPerFile,patchHash)
+
+    skeys = set(openFileHash.values())  #close each file once.
+    for f in skeys:
+        f.close()
+
+    if patch:
+        for s in cutHash:
+            removeBytes(filenameHash[s],cutHash[s])
+
+    return bytesRead,filteredMolNumPerRunID,numMolPerFile
+
+
+#function writes '# Number of Molecules:' line to each new bnx file with spaces in place of the number, as wide as the
+#number before filtering, numMolPerFile. the file offset and width are added to patchHash, see patchCounts.
+def writePaddedCount(openFileHash,sValue,numMolPerFile,patchHash):
+    if sValue == 0:
+        skeys = [list(openFileHash.keys())[0]]
+        widths = [len(str(numMolPerFile.get('one',0)))]
+    else:
+        skeys = list(openFileHash.keys())
+        widths = [len(str(numMolPerFile.get(s,0))) for s in skeys]
+
+    for s,width in zip(skeys,widths):
+        outfile = openFileHash[s]
+        outfile.write(b'# Number of Molecules:\t')
+        patchHash.setdefault(s,[]).append([outfile.tell(),width])
+        outfile.write(b' '*width+b'\n')
+
+
+#function writes the number of molecules after filtering, numMolPerFile, over the spaces written by writePaddedCount.
+#an OutputFile (see outputs.py) writes it with patch, a plain file with seek. returns dict of the spaces left after each
+#number, key is the scan number key of the new bnx file, value is list of [file offset,number of bytes], see removeBytes.
+def patchCounts(openFileHash,sValue,numMolPerFile,patchHash):
+    cutHash = {}
+    for s in patchHash:
+        if sValue == 0:
+            count = numMolPerFile.get('one',0)
+        else:
+            count = numMolPerFile.get(s,0)
+        data = str(count).encode()
+
+        outfile = openFileHash[s]
+        for offset,width in patchHash[s]:
+            if hasattr(outfile,'patch'):
+                outfile.patch(offset,data)
+            else:
+                end = outfile.tell()
+                outfile.seek(offset)
+                outfile.write(data)
+                outfile.seek(end)
+            if width > len(data):
+                cutHash.setdefault(s,[]).append([offset+len(data),width-len(data)])
+
+    return cutHash
+
+
+#function removes bytes from closed file filename: cuts is list of [file offset,number of bytes] in order of offset.
+#the rest of the file is moved to the front in chunks of 16 MB and the file is truncated.
+def removeBytes(filename,cuts):
+    chunkSize = 16*1024*1024
+    outfile = open(filename,'r+b')
+    fileSize = os.path.getsize(filename)
+
+    writeAt = cuts[0][0]
+    for i in range(0,len(cuts)):
+        readAt = cuts[i][0]+cuts[i][1]
+        readEnd = fileSize
+        if i+1 < len(cuts):
+            readEnd = cuts[i+1][0]
+
+        while readAt < readEnd:
+            outfile.seek(readAt)
+            data = outfile.read(min(chunkSize,readEnd-readAt))
+            outfile.seek(writeAt)
+            outfile.write(data)
+            readAt += len(data)
+            writeAt += len(data)
+
+    outfile.truncate(writeAt)
+    outfile.close()
@@ -0,0 +1,415 @@
+# First read of the bnx file: runIDs, maximum colID and number of molecules per runID, byte offsets of
+# blocks of molecules, and the index cache file that saves these results.
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+
+from .bnxio import fileCompression,openBNXFile,hasCRLF
+
+#version of the index cache file. index cache files of an other version are not used, the bnx file is read again.
+#version 2: lines 1, 2 and QX after a header line or a line that is not written are in the block of their molecule.
+#version 3: bytes of the molecules of each runID, runIDBytes.
+INDEX_CACHE_VERSION = 3
+
+
+#function will iterate through every molecule in .bnx file.
+#It will search for the maximum colID for each value of runID.
+#the maximum colID value for each runID informs the code on how to split the
+#bnx file by scan.
+#if spoolDir is given (single pass mode), the header lines are also written to spoolDir/header.bnx
+#and each molecule is written to a spool file for its runID, spoolDir/runID_<runID>.bnx, so the
+#bnx file does not need to be read a second time by readBNXFile.
+#the function also returns blockList, a byte offset index of the bnx file. Each entry is [key,start,end]:
+#key is the runID of a block of molecules next to each other in the file, '#' for a block of header lines,
+#or '' for a block of lines that are not written to new bnx files. readBNXFile uses blockList to copy
+#whole blocks of molecules. blockList is None if the bnx file does not have '\n' line endings.
+#if numProcs > 1, the bnx file is split into chunks that start at a molecule (line beginning with '0\t').
+#each chunk is read by scanBNXChunk in a pool of numProcs processes, and the results are merged.
+#single pass mode always reads the bnx file in one process.
+#a compressed bnx file (.gz or .zst) is read in one process, with numProcs threads for decompression if possible.
+#blockList is None for a compressed bnx file, the byte offsets can not be used to copy blocks.
+#if progress is given, progress(numMolecules) is called with the number of molecules read so far, see RunStats.progress.
+#engine: 'bytes' reads each chunk with scanBNXChunkBytes (see blocks.py) instead of line by line, not in single pass mode.
+def findNumberColumnsPerBank(filename,spoolDir='',numProcs=1,progress=None,engine='lines'):
+    maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,offsetsUsable = indexBNXFile(filename,spoolDir,numProcs,progress,engine)
+
+    if not offsetsUsable:
+        blockList = None
+
+    #return maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList
+    return maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList
+
+
+#function reads the bnx file the first time, the same as findNumberColumnsPerBank, but always returns blockList.
+#offsetsUsable is False if the bnx file is compressed or has '\r\n' line endings: the byte offsets of blockList are then
+#not byte offsets of the bnx file and can not be used to copy blocks, but the order of the blocks and their sizes can.
+def indexBNXFile(filename,spoolDir='',numProcs=1,progress=None,engine='lines'):
+    #compressed: True if bnx file is compressed.
+    compressed = fileCompression(filename) != ''
+
+    #crlf: True if bnx file has '\r\n' line endings. byte offsets are not used then.
+    crlf = hasCRLF(filename)
+
+    #size of bnx file in bytes. compressed bnx file is read to the end.
+    if compressed:
+        fileSize = sys.maxsize
+    else:
+        fileSize = os.path.getsize(filename)
+
+    #chunkFunction: reads one chunk of the bnx file.
+    chunkFunction = scanBNXChunk
+    if engine == 'bytes' and len(spoolDir) == 0:
+        from .blocks import scanBNXChunkBytes
+        chunkFunction = scanBNXChunkBytes
+
+    if numProcs > 1 and len(spoolDir) == 0 and not compressed:
+        #use about 4 chunks per process so that processes finish at about the same time. each chunk at least 1 MB.
+        numChunks = max(1,min(numProcs*4,fileSize//(1024*1024)))
+        chunkStarts = findChunkStarts(filename,fileSize,numChunks)
+
+        chunkArgs = []
+        for i in range(0,len(chunkStarts)):
+            if i+1 < len(chunkStarts):
+                chunkArgs.append((filename,chunkStarts[i],chunkStarts[i+1],crlf,'',1,None))
+            else:
+                chunkArgs.append((filename,chunkStarts[i],fileSize,crlf,'',1,None))
+
+        #chunk results in order of chunkArgs. progress is reported after each chunk.
+        pool = multiprocessing.Pool(numProcs)
+        chunkResults = []
+        numMolecules = 0
+        for result in pool.imap(chunkFunction,chunkArgs):
+            chunkResults.append(result)
+            if progress is not None:
+                numMolecules += sum(result[2].values())
+                progress(numMolecules)
+        pool.close()
+        pool.join()
+    else:
+        chunkResults = [chunkFunction((filename,0,fileSize,crlf,spoolDir,numProcs,progress))]
+
+    #merge results of chunks.
+    maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList = mergeChunkResults(chunkResults)
+
+    return maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,not (crlf or compressed)
+
+
+#function finds byte offsets where to start each of numChunks chunks of bnx file.
+#the first chunk starts at 0. each other chunk starts at the first molecule (line beginning with '0\t')
+#after fileSize*i/numChunks. chunks without a molecule start are dropped.
+def findChunkStarts(filename,fileSize,numChunks):
+    infile = open(filename,'rb')
+
+    chunkStarts = [0]
+    for i in range(1,numChunks):
+        infile.seek(fileSize*i//numChunks)
+        infile.readline()   #skip rest of line, the seek is likely in middle of line.
+
+        #read lines until line starts with '0\t'. offset is byte offset of line.
+        offset = infile.tell()
+        line = infile.readline()
+        while len(line) > 0 and line[0:2] != b'0\t':
+            offset += len(line)
+            line = infile.readline()
+
+        #if end of file reached, or chunk would start at same place as previous, do not add chunk.
+        if len(line) > 0 and offset > chunkStarts[-1]:
+            chunkStarts.append(offset)
+
+    infile.close()
+
+    return chunkStarts
+
+
+#function reads bnx file from byte offset start to byte offset end, see findNumberColumnsPerBank.
+#chunkArgs is the tuple (filename,start,end,crlf,spoolDir,threads,progress), so that scanBNXChunk can be used by multiprocessing.Pool.map.
+#threads is the number of threads for decompression of a compressed bnx file.
+#progress: None, or function called every 100000 molecules with the number of molecules read (None in pool processes).
+#returns runIDList (runID values of '# Run Data' lines in the chunk), runIDMaxColHash, molNumPerRunID, maxColID and blockList of the chunk.
+def scanBNXChunk(chunkArgs):
+    filename,start,end,crlf,spoolDir,threads,progress = chunkArgs
+
+    #open .bnx file, filename. binary mode so that byte offsets of each line are known.
+    infile = openBNXFile(filename,threads)
+    if start > 0:
+        infile.seek(start)
+
+    #blockList: byte offset index of blocks of lines. blockKey: key of the current block.
+    #offset: byte offset of the start of the next line.
+    #moleculeKey: runID of the current molecule, lines 1, 2 and QX after a header line or a line that is not written
+    #belong to it. '' before the first molecule of the chunk, those lines are not written.
+    blockList = []
+    blockKey = None
+    moleculeKey = ''
+    offset = start
+
+    #headerSpool: open file object for header lines. spoolFile: open spool file of the current runID, spoolRunID.
+    #only one molecule spool file is open at a time. molecules of a runID are next to each other in the bnx file.
+    headerSpool = None
+    spoolFile = None
+    spoolRunID = ''
+    if len(spoolDir) > 0:
+        headerSpool = open(os.path.join(spoolDir,'header.bnx'),'wb')
+
+    #list of runID values 
+    runIDList = []
+
+    #molNumPerRunID: keys is runID, value is number of molecules in runID
+    molNumPerRunID = {}
+
+    #runIDMaxColHash: key runID, value maximum colID for given runID.
+    runIDMaxColHash = {}
+
+    #maximum colID for entire .bnx file.
+    maxColID = 0
+
+    #number of molecules read, for progress.
+    numMolecules = 0
+
+    #iterate through each line in the .bnx file.
+    for line in infile:
+        #stop at end of chunk.
+        if offset >= end:
+            break
+
+        #lineStart: byte offset of line. key: block key of line, the runID of the current molecule for lines 1, 2, QX11, QX12, QX21, QX22.
+        lineStart = offset
+        offset += len(line)
+        key = moleculeKey
+
+        #if file has '\r\n' line endings, change to '\n' like reading the file in universal newline mode.
+        if crlf:
+            line = line.replace(b'\r\n',b'\n')
+
+        if line[0:1] == b'#':
+            key = '#'
+
+            #if single pass mode, keep each header line in header spool file.
+            if headerSpool is not None:
+                headerSpool.write(line)
+
+        #if the line begins with '# Run Data', pull out runID values.
+        if line[0:10] == b'# Run Data':
+            #split line based on tab. add to word list.
+            word = (line.strip()).split(b'\t')
+
+            #add runID value, word[-1], to runIDList
+            runIDList.append(int(word[-1]))
+            #add runID, word[-1], to runIDMaxColHash, set value to 0. 
+            runIDMaxColHash[word[-1].decode()] = 0
+
+        #read each line that begins with 0, molecule information.
+        if line[0:1] == b'0':
+            #split line by whitespace. add values to word list.
+            word = line.split()
+
+            #pull runID and colID from 0 line.
+            runID = word[11].decode()
+            colID = int(word[12])
+            key = runID
+            moleculeKey = runID
+
+            if runID in molNumPerRunID:
+                molNumPerRunID[runID] += 1
+            else:
+                molNumPerRunID[runID] = 1
+
+            numMolecules += 1
+            if progress is not None and numMolecules % 100000 == 0:
+                progress(numMolecules)
+
+
+            #Check if colID is largest value observed for runID via runIDMaxColHash[runID].
+            #if largest value, replace runIDMaxColHash[runID] with current colID value.
+            #the '# Run Data' line of runID may be in an other chunk, checked in mergeChunkResults.
+            if runID not in runIDMaxColHash or colID > runIDMaxColHash[runID]:
+                runIDMaxColHash[runID] = colID
+
+            #check if colID is largest value observed for all molecules. Store value in maxColID
+            if colID > maxColID:
+                maxColID = colID
+
+            #if single pass mode, write molecule to spool file of runID. open new spool file if runID changed.
+            if headerSpool is not None:
+                if runID != spoolRunID:
+                    if spoolFile is not None:
+                        spoolFile.close()
+                    spoolFile = open(spoolFileName(spoolDir,runID),'ab')   #append! runID may appear again later in file.
+                    spoolRunID = runID
+                spoolFile.write(line)
+
+        #lines 1, 2, QX11, QX12, QX21, QX22 of molecule. if single pass mode, write line to spool file of current runID.
+        elif line[0:1] == b'1' or line[0:1] == b'2' or line[0:4] in (b'QX11',b'QX12',b'QX21',b'QX22'):
+            if spoolFile is not None:
+                spoolFile.write(line)
+
+        #any other line is not written to new bnx files.
+        elif line[0:1] != b'#':
+            key = ''
+
+        #if key changed, end current block and start new block at this line.
+        if key != blockKey:
+            if len(blockList) > 0:
+                blockList[-1][2] = lineStart
+            blockList.append([key,lineStart,offset])
+            blockKey = key
+
+    infile.close()
+
+    #end last block at end of chunk.
+    if len(blockList) > 0:
+        blockList[-1][2] = offset
+
+    if headerSpool is not None:
+        headerSpool.close()
+    if spoolFile is not None:
+        spoolFile.close()
+
+    return runIDList,runIDMaxColHash,molNumPerRunID,maxColID,blockList
+
+
+#function merges results of scanBNXChunk for each chunk, in order of the chunks in the bnx file.
+#returns maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList the same as reading the bnx file in one chunk.
+def mergeChunkResults(chunkResults):
+    runIDList = []
+    runIDMaxColHash = {}
+    molNumPerRunID = {}
+    maxColID = 0
+    blockList = []
+
+    for cRunIDList,cRunIDMaxColHash,cMolNumPerRunID,cMaxColID,cBlockList in chunkResults:
+        #runID values in order of '# Run Data' lines.
+        runIDList += cRunIDList
+
+        #maximum colID for each runID.
+        for r in cRunIDMaxColHash:
+            if r not in runIDMaxColHash or cRunIDMaxColHash[r] > runIDMaxColHash[r]:
+                runIDMaxColHash[r] = cRunIDMaxColHash[r]
+
+        #number of molecules for each runID.
+        for r in cMolNumPerRunID:
+            if r in molNumPerRunID:
+                molNumPerRunID[r] += cMolNumPerRunID[r]
+            else:
+                molNumPerRunID[r] = cMolNumPerRunID[r]
+
+        if cMaxColID > maxColID:
+            maxColID = cMaxColID
+
+        #if first block of chunk continues last block of previous chunk (same runID), join the blocks.
+        for b in cBlockList:
+            if len(blockList) > 0 and blockList[-1][0] == b[0] and blockList[-1][2] == b[1]:
+                blockList[-1][2] = b[2]
+            else:
+                blockList.append(b)
+
+    #each runID of a molecule must have a '# Run Data' line.
+    runIDHash = {}
+    for r in runIDList:
+        runIDHash[str(r)] = 1
+    for r in molNumPerRunID:
+        if r not in runIDHash:
+            raise KeyError(r)
+
+    return maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList
+
+
+#function returns True if the spool files of single pass mode keep the order of the bnx file, see stitchSpoolFiles:
+#all header lines are before the first molecule, and the molecules of each runID are next to each other, in order of runIDList.
+#blockList: blocks of the bnx file from indexBNXFile.
+def spoolKeepsOrder(blockList,runIDList):
+    #runIDKeys: runID of each block of molecules, blocks of the same runID next to each other (or with only lines that
+    #are not written between them) once.
+    runIDKeys = []
+    for b in blockList:
+        if b[0] == '#':
+            if len(runIDKeys) > 0:
+                return False
+        elif b[0] != '' and (len(runIDKeys) == 0 or runIDKeys[-1] != b[0]):
+            runIDKeys.append(b[0])
+
+    runIDHash = dict.fromkeys(runIDKeys,1)
+    return runIDKeys == [str(r) for r in runIDList if str(r) in runIDHash]
+
+
+#function returns dict with the bytes of the molecules of each runID in blockList (from indexBNXFile), key runID.
+#for a compressed bnx file these are bytes after decompression.
+def bytesPerRunID(blockList,runIDList):
+    runIDBytes = dict.fromkeys([str(r) for r in runIDList],0)
+    for b in blockList:     #b = [key,start,end], key is runID for blocks of molecules.
+        if b[0] != '#' and b[0] != '':
+            runIDBytes[b[0]] += b[2]-b[1]
+
+    return runIDBytes
+
+
+#name of spool file for runID in single pass mode.
+def spoolFileName(spoolDir,runID):
+    return os.path.join(spoolDir,'runID_'+str(runID)+'.bnx')
+
+
+#name of index cache file for bnx file filename. if cacheDir is not given, cache file is next to the bnx file.
+#in cacheDir, the name has a checksum of the full path of the bnx file so that bnx files with the same name do not share a cache file.
+def indexCacheFileName(filename,cacheDir):
+    if len(cacheDir) == 0:
+        return filename+'.scanIndex.json'
+
+    pathSum = hashlib.md5(os.path.abspath(filename).encode()).hexdigest()[0:12]
+    return os.path.join(cacheDir,os.path.basename(filename)+'_'+pathSum+'.scanIndex.json')
+
+
+#function computes md5 checksum of the header lines at the start of the bnx file (lines beginning with '#').
+def computeHeaderChecksum(filename):
+    headerSum = hashlib.md5()
+
+    infile = openBNXFile(filename)
+    for line in infile:
+        if line[0:1] != b'#':
+            break
+        headerSum.update(line)
+    infile.close()
+
+    return headerSum.hexdigest()
+
+
+#function returns the key of the index cache of bnx file: file size, modification time and header checksum.
+def indexCacheKey(filename):
+    fileStat = os.stat(filename)
+    return {'fileSize':fileStat.st_size,'mtime':fileStat.st_mtime,'headerChecksum':computeHeaderChecksum(filename)}
+
+
+#function reads results of findNumberColumnsPerBank from index cache file.
+#returns None if there is no cache file, or it was written for a different version of the bnx file.
+def readIndexCache(filename,cacheFile):
+    if not os.path.exists(cacheFile):
+        return None
+
+    try:
+        infile = open(cacheFile,'r')
+        cache = json.load(infile)
+        infile.close()
+    except (OSError,ValueError):    #unreadable or partly written cache file. read bnx file again.
+        return None
+
+    if cache.get('version') != INDEX_CACHE_VERSION or cache.get('key') != indexCacheKey(filename):
+        return None
+
+    return cache['maxColID'],cache['runIDList'],cache['runIDMaxColHash'],cache['molNumPerRunID'],cache['blockList'],cache['runIDBytes']
+
+
+#function writes results of findNumberColumnsPerBank to index cache file.
+#the file is written to a temporary name and renamed so that a failed run does not leave a partly written cache file.
+#if the cache file can not be written, print a warning and continue.
+def writeIndexCache(filename,cacheFile,maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,runIDBytes):
+    cache = {'version':INDEX_CACHE_VERSION,'key':indexCacheKey(filename),'maxColID':maxColID,'runIDList':runIDList,
+             'runIDMaxColHash':runIDMaxColHash,'molNumPerRunID':molNumPerRunID,'blockList':blockList,'runIDBytes':runIDBytes}
+
+    try:
+        outfile = open(cacheFile+'.tmp','w')
+        json.dump(cache,outfile)
+        outfile.close()
+        os.rename(cacheFile+'.tmp',cacheFile)
+    except OSError as e:
+        print('#### WARNING: could not write index cache file '+cacheFile+': '+str(e))
@@ -0,0 +1,298 @@
+# Live mode: split a bnx file while the instrument is still writing it. The bnx file is read again every few seconds
+# from where the last read stopped, and each new bnx file is written as soon as all molecules of its scans are in the
+# bnx file, so that later steps can start on the first scans before the flowcell is finished.
+import os
+import json
+import time
+import hashlib
+
+from .bnxio import fileCompression,hasCRLF,openOutputFile
+from .index import scanBNXChunk,mergeChunkResults
+from .scans import findRunIDPerBank,determineRunIDPerScan,groupRunIDByScan,printRunIDInformation,parseScanRange,computeNumMoleculesPerBNX
+from .split import generateFileNames,copyBNXBlocks
+
+CHECKPOINT_VERSION = 1
+
+#number of bytes at the start of the bnx file whose checksum is kept in the checkpoint file, to find out if the bnx file was replaced.
+CHECKSUM_BYTES = 1024*1024
+
+
+#function returns byte offset where to stop reading bnx file filename, read from offset start up to fileSize.
+#the read stops before the last molecule (line beginning with '0\t'), which may not be completely written yet.
+#if there is no molecule after start, the read stops after the last complete header line.
+def findLiveEnd(filename,start,fileSize):
+    infile = open(filename,'rb')
+
+    #search backwards in blocks of 1 MB for the last '\n0\t' after start.
+    #2 bytes more than the block are read, so that '\n0\t' across two blocks is found.
+    blockSize = 1024*1024
+    end = fileSize
+    lastNewline = -1
+    while end > start:
+        blockStart = max(start,end-blockSize)
+        infile.seek(blockStart)
+        block = infile.read(end-blockStart+2)
+
+        if lastNewline < 0:
+            i = block.rfind(b'\n',0,end-blockStart)
+            if i >= 0:
+                lastNewline = blockStart+i
+
+        i = block.rfind(b'\n0\t')
+        if i >= 0:
+            infile.close()
+            return blockStart+i+1
+        end = blockStart
+
+    #no molecule after start. if the read starts at the last molecule, wait for the next one.
+    infile.seek(start)
+    firstBytes = infile.read(2)
+    infile.close()
+
+    if lastNewline < 0 or firstBytes == b'0\t':
+        return start
+    return lastNewline+1
+
+
+#function returns md5 checksum of the first bytes of bnx file filename, at most numBytes.
+def prefixChecksum(filename,numBytes):
+    infile = open(filename,'rb')
+    checksum = hashlib.md5(infile.read(min(numBytes,CHECKSUM_BYTES))).hexdigest()
+    infile.close()
+    return checksum
+
+
+#function reads checkpoint file of live mode. returns the checkpoint dict, or None if there is no checkpoint file or
+#it is for an other bnx file, for example if the bnx file was written again from the start.
+def readCheckpoint(filename,checkpointFile):
+    if not os.path.exists(checkpointFile):
+        return None
+
+    try:
+        infile = open(checkpointFile,'r')
+        checkpoint = json.load(infile)
+        infile.close()
+    except (OSError,ValueError):
+        return None
+
+    if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('bnxFile') != os.path.abspath(filename):
+        return None
+    if os.path.getsize(filename) < checkpoint['offset'] or prefixChecksum(filename,checkpoint['offset']) != checkpoint['checksum']:
+        return None
+
+    return checkpoint
+
+
+#function writes checkpoint dict to checkpoint file. written to a temporary name and renamed, so that a stopped run
+#does not leave a partly written checkpoint file.
+def writeCheckpoint(filename,checkpointFile,checkpoint):
+    checkpoint['checksum'] = prefixChecksum(filename,checkpoint['offset'])
+
+    outfile = open(checkpointFile+'.tmp','w')
+    json.dump(checkpoint,outfile)
+    outfile.close()
+    os.replace(checkpointFile+'.tmp',checkpointFile)
+
+
+#function returns runIDPerScan if enough banks of the run are complete (at least lockBanks), else None.
+def liveRunIDPerScan(maxColID,runIDList,runIDMaxColHash,lockBanks):
+    if len(findRunIDPerBank(maxColID,runIDList,runIDMaxColHash)) < lockBanks:
+        return None
+    return determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash)
+
+
+#function writes the new bnx files whose scans are all complete and not written yet, see follow_bnx.
+#final: True at the end of the run, then every new bnx file is complete.
+#returns list of new bnx file names written.
+def writeCompleteFiles(sValue,strScanRange,filename,prefix,compress,threads,checkpoint,final):
+    runIDList = checkpoint['runIDList']
+    runIDPerScan = checkpoint['runIDPerScan']
+    runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+
+    #number of molecules of each runID, 0 for runIDs without molecules yet.
+    molNumPerRunID = dict.fromkeys([str(r) for r in runIDList],0)
+    molNumPerRunID.update(checkpoint['molNumPerRunID'])
+
+    #scans before the last scan with molecules are complete: molecules are written runID after runID.
+    lastScan = 0
+    for r in checkpoint['molNumPerRunID']:
+        lastScan = max(lastScan,runIDToScanHash[r][0])
+
+    scanHash = parseScanRange(sValue,runIDToScanHash,strScanRange)
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+
+    #groupHash: for each new bnx file name, list of scan numbers written to it.
+    groupHash = {}
+    for s in filenameHash:
+        groupHash.setdefault(filenameHash[s],[]).append(s)
+    if sValue == 0 and len(groupHash) > 0:
+        #all scan numbers of the range are written to the same file, also scans that are not in the run yet.
+        groupHash = {list(groupHash.keys())[0]:list(scanHash.keys())}
+
+    written = []
+    for name in sorted(groupHash):
+        if name in checkpoint['written']:
+            continue
+        scans = groupHash[name]
+        if not final and max(int(s) for s in scans) >= lastScan:
+            continue
+
+        #only scans of this file in openFileHash. file is written to name.tmp and renamed when complete.
+        scans = [s for s in scans if s in filenameHash]
+        fileScanHash = dict((s,scanHash[s]) for s in scans)
+        numMolPerFile = computeNumMoleculesPerBNX(sValue,runIDList,fileScanHash,runIDToScanHash,molNumPerRunID)
+        if sValue == 0 and 'one' not in numMolPerFile:
+            numMolPerFile['one'] = 0
+        for s in scans:
+            if sValue == 1 and s not in numMolPerFile:
+                numMolPerFile[s] = 0
+
+        outfile = openOutputFile(name+'.tmp',compress,threads)
+        openFileHash = dict((s,outfile) for s in scans)
+        copyBNXBlocks(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,checkpoint['blockList'])
+        outfile.close()
+        os.replace(name+'.tmp',name)
+
+        #offset: end of bnx file read when the file was written. header lines after it are not in the file.
+        checkpoint['written'][name] = checkpoint['offset']
+        written.append(name)
+
+    return written
+
+
+#function removes the new bnx files in written (names of new bnx files written before) that are not new bnx files with
+#runIDPerScan, for example Scan25 of a run that has fewer scans with the new runIDPerScan. the same file name with an
+#other compression suffix and partly written .tmp files are removed too.
+def removeStaleFiles(sValue,strScanRange,runIDList,runIDPerScan,prefix,compress,written):
+    runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+    scanHash = parseScanRange(sValue,runIDToScanHash,strScanRange)
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+    newNames = set(filenameHash.values())
+
+    for name in written:
+        if name in newNames:
+            continue
+
+        #base: name without compression suffix.
+        base = name
+        for suffix in ('.gz','.zst'):
+            if base.endswith(suffix):
+                base = base[0:-len(suffix)]
+        for staleName in (base,base+'.gz',base+'.zst'):
+            for n in (staleName,staleName+'.tmp'):
+                if n not in newNames and os.path.exists(n):
+                    os.remove(n)
+
+
+#function splits bnx file filename while it is written, the same as split_by_scan with selection and prefix.
+#the bnx file is read every pollSeconds from where the last read stopped, up to the last molecule that may be incomplete.
+#the results are merged like the chunks of findNumberColumnsPerBank. once lockBanks banks are complete, runIDPerScan is
+#determined, and a new bnx file is written when a molecule of a later scan is in the bnx file (molecules are written runID
+#after runID). the run is finished when the bnx file did not grow for idleSeconds: the rest of the bnx file is read,
+#runIDPerScan is determined again from all runIDs, and the remaining new bnx files and prefix_runID_to_scan.txt are written.
+#new bnx files written before are written again if runIDPerScan changed or header lines were added after them, so that the
+#new bnx files are the same as from split_by_scan. if runIDPerScan changed, new bnx files of scans that are not in the run
+#with the new runIDPerScan are removed.
+#after each read, the results are saved in checkpointFile (default prefix_live_checkpoint.json). a restarted run continues
+#from the checkpoint file.
+def follow_bnx(filename,selection=None,prefix='some_great_data',checkpointFile='',pollSeconds=30,idleSeconds=1800,lockBanks=8,
+                  compress='',threads=1,verbose=False):
+    filename = os.fspath(filename)
+    if fileCompression(filename) != '' or hasCRLF(filename):
+        raise ValueError('live mode needs a bnx file that is not compressed and has \\n line endings: '+filename)
+
+    #sValue and strScanRange, the same as -s and -r.
+    if selection is None:
+        sValue = 1
+        strScanRange = ''
+    elif isinstance(selection,str):
+        sValue = 0
+        strScanRange = selection
+    else:
+        sValue = 0
+        strScanRange = ','.join(str(s) for s in selection)
+
+    if len(checkpointFile) == 0:
+        checkpointFile = prefix+'_live_checkpoint.json'
+
+    checkpoint = readCheckpoint(filename,checkpointFile)
+    if checkpoint is None:
+        checkpoint = {'version':CHECKPOINT_VERSION,'bnxFile':os.path.abspath(filename),'offset':0,'runIDList':[],
+                      'runIDMaxColHash':{},'molNumPerRunID':{},'maxColID':0,'blockList':[],'runIDPerScan':None,'written':{}}
+    elif verbose:
+        print('Continuing From Checkpoint File:\t'+checkpointFile+'\t'+str(checkpoint['offset'])+' bytes read')
+
+    lastSize = -1
+    lastGrowth = time.time()
+    while True:
+        fileSize = os.path.getsize(filename)
+        if fileSize != lastSize:
+            lastSize = fileSize
+            lastGrowth = time.time()
+
+        final = time.time()-lastGrowth >= idleSeconds
+
+        #read new part of bnx file. at the end of the run, read to the end of the file.
+        if final:
+            end = fileSize
+        else:
+            end = findLiveEnd(filename,checkpoint['offset'],fileSize)
+
+        if end > checkpoint['offset']:
+            chunk = (checkpoint['runIDList'],checkpoint['runIDMaxColHash'],checkpoint['molNumPerRunID'],checkpoint['maxColID'],checkpoint['blockList'])
+            result = scanBNXChunk((filename,checkpoint['offset'],end,False,'',1,None))
+            maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList = mergeChunkResults([chunk,result])
+            checkpoint.update({'offset':end,'runIDList':runIDList,'runIDMaxColHash':runIDMaxColHash,'molNumPerRunID':molNumPerRunID,
+                               'maxColID':maxColID,'blockList':blockList})
+
+        if final:
+            break
+
+        #runIDPerScan is fixed once enough banks are complete, so that the scan numbers of written files do not change.
+        if checkpoint['runIDPerScan'] is None:
+            checkpoint['runIDPerScan'] = liveRunIDPerScan(checkpoint['maxColID'],checkpoint['runIDList'],checkpoint['runIDMaxColHash'],lockBanks)
+            if checkpoint['runIDPerScan'] is not None:
+                checkpoint['runIDPerScan'] = float(checkpoint['runIDPerScan'])
+                if verbose:
+                    print('Run IDs Per Scan:\t'+str(checkpoint['runIDPerScan']))
+
+        if checkpoint['runIDPerScan'] is not None:
+            for name in writeCompleteFiles(sValue,strScanRange,filename,prefix,compress,threads,checkpoint,False):
+                if verbose:
+                    print('Scan Complete:\t'+name)
+
+        writeCheckpoint(filename,checkpointFile,checkpoint)
+        time.sleep(pollSeconds)
+
+    #end of run: runIDPerScan from all runIDs, the same as split_by_scan.
+    maxColID = checkpoint['maxColID']
+    runIDList = checkpoint['runIDList']
+    runIDMaxColHash = checkpoint['runIDMaxColHash']
+    runIDPerScan = float(determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash))
+
+    #new bnx files to write again: all if runIDPerScan changed, else those with header lines after them.
+    if checkpoint['runIDPerScan'] != runIDPerScan:
+        if verbose and len(checkpoint['written']) > 0:
+            print('#### WARNING: Run IDs Per Scan changed from '+str(checkpoint['runIDPerScan'])+' to '+str(runIDPerScan)+', writing all new bnx files again')
+        removeStaleFiles(sValue,strScanRange,runIDList,runIDPerScan,prefix,compress,checkpoint['written'])
+        checkpoint['written'] = {}
+        checkpoint['runIDPerScan'] = runIDPerScan
+        writeCheckpoint(filename,checkpointFile,checkpoint)
+    else:
+        for name in list(checkpoint['written']):
+            for b in checkpoint['blockList']:
+                if b[0] == '#' and b[2] > checkpoint['written'][name]:
+                    del checkpoint['written'][name]
+                    break
+
+    for name in writeCompleteFiles(sValue,strScanRange,filename,prefix,compress,threads,checkpoint,True):
+        if verbose:
+            print('Scan Complete:\t'+name)
+
+    runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+    printRunIDInformation(maxColID,runIDPerScan,runIDList,runIDMaxColHash,runIDToScanHash,checkpoint['molNumPerRunID'],prefix)
+
+    checkpoint['done'] = True
+    writeCheckpoint(filename,checkpointFile,checkpoint)
+
+    return checkpoint
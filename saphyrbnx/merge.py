@@ -0,0 +1,227 @@
+# Merge mode: the molecules of the selected scan numbers of several bnx files of the same chip (for example of a run
+# that was restarted) are written to one new bnx file, with one header, the total number of molecules, molecule IDs
+# renumbered from 1 and runIDs made unique. Each bnx file is read only once: in the first step each bnx file is read in
+# its own process in single pass mode (spool file per runID), in the second step the spool files of the selected runIDs
+# of each bnx file are written to a part file with the new molecule IDs and runIDs, also in parallel, and the part files
+# are joined after the header.
+import os
+import re
+import shutil
+import tempfile
+import concurrent.futures
+
+from .bnxio import openOutputFile,compressSuffix
+from .index import findNumberColumnsPerBank,spoolFileName
+from .scans import determineRunIDPerScan,groupRunIDByScan,parseScanRange
+from .batch import batchWorkers
+from .blocks import iterBlocks
+
+#0 line of a molecule in a spool file, after a '\n': group 1 is field 0 and the whitespace after it, group 2 the molecule ID
+#(field 1), group 3 fields 2 to 10 with the whitespace around them, group 4 the runID (field 11).
+ZERO_LINE = re.compile(rb'\n(0\S*[ \t]+)(\S+)((?:[ \t]+\S+){9}[ \t]+)(\S+)')
+
+
+#function reads one bnx file of a merge in single pass mode, see findNumberColumnsPerBank. jobArgs is the tuple
+#(bnxFile,spoolDir,threads). returns maxColID,runIDList,runIDMaxColHash,molNumPerRunID.
+def indexMergeInput(jobArgs):
+    bnxFile,spoolDir,threads = jobArgs
+    maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList = findNumberColumnsPerBank(bnxFile,spoolDir,threads)
+    return maxColID,runIDList,runIDMaxColHash,molNumPerRunID
+
+
+#function writes the spool files of runIDs (str) in spoolDir to partFile, with molecule IDs from firstMoleculeID and
+#each runID r changed to r+runIDOffset. jobArgs is the tuple (spoolDir,runIDs,runIDOffset,firstMoleculeID,partFile).
+#returns the number of molecules written.
+def writeMergePart(jobArgs):
+    spoolDir,runIDs,runIDOffset,firstMoleculeID,partFile = jobArgs
+
+    #moleculeID: molecule ID of the next molecule.
+    moleculeID = [firstMoleculeID]
+
+    def renumber(m):
+        newLine = b'\n'+m.group(1)+str(moleculeID[0]).encode()+m.group(3)+newRunID
+        moleculeID[0] += 1
+        return newLine
+
+    outfile = open(partFile,'wb')
+    for r in runIDs:
+        spoolName = spoolFileName(spoolDir,r)
+        if not os.path.exists(spoolName):  #runID without molecules.
+            continue
+
+        #spool file is read in blocks of whole lines, see iterBlocks. '\n' before each block so that the first 0 line is
+        #found, removed again when written.
+        newRunID = str(int(r)+runIDOffset).encode()
+        infile = open(spoolName,'rb')
+        for block in iterBlocks(infile):
+            outfile.write(ZERO_LINE.sub(renumber,b'\n'+block)[1:])
+        infile.close()
+    outfile.close()
+
+    return moleculeID[0]-firstMoleculeID
+
+
+#function returns the header lines of a merge: the header lines of the first bnx file, with the '# Run Data' lines of the
+#other bnx files after its own (runIDs changed by their runIDOffset) and the total number of molecules.
+#headerList: list of header lines (bytes) of each bnx file. runIDOffsetList: runIDOffset of each bnx file.
+def mergeHeaders(headerList,runIDOffsetList,numMolecules):
+    #'# Run Data' lines of the other bnx files, with new runIDs (the last field).
+    runDataLines = []
+    for i in range(1,len(headerList)):
+        for line in headerList[i]:
+            if line[0:10] == b'# Run Data':
+                word = line.rstrip(b'\r\n').split(b'\t')
+                word[-1] = str(int(word[-1])+runIDOffsetList[i]).encode()
+                runDataLines.append(b'\t'.join(word)+b'\n')
+
+    #position after the last '# Run Data' line of the first bnx file, or the end of its header.
+    lines = headerList[0]
+    insertAt = len(lines)
+    for i in range(0,len(lines)):
+        if lines[i][0:10] == b'# Run Data':
+            insertAt = i+1
+
+    header = []
+    for line in lines[0:insertAt]+runDataLines+lines[insertAt:]:
+        if line[0:22] == b'# Number of Molecules:':
+            line = b'# Number of Molecules:\t'+str(numMolecules).encode()+b'\n'
+        header.append(line)
+
+    return header
+
+
+#function returns the value of header line key (for example b'# Label Channels:') in header lines, or None.
+def headerValue(lines,key):
+    for line in lines:
+        if line[0:len(key)] == key:
+            return line[len(key):].strip()
+    return None
+
+
+#function merges the selected scan numbers of bnx files sources into one new bnx file, see the top of this file.
+#selection: None for all scan numbers, or a range of scan numbers such as '1-10,15-20' or a list of scan numbers, the
+#same as split_by_scan. the scan numbers of each bnx file are found with determineRunIDPerScan and groupRunIDByScan.
+#the new bnx file is sink_merged.bnx, or sink_ScanRange_1-10_15-20_merged.bnx for a selection (.gz or .zst if compress).
+#runIDs of the first bnx file are not changed, the runIDs of each next bnx file are increased by the largest runID of
+#the bnx files before it. sink_merged_runIDs.txt lists the runIDs of each bnx file and their new runIDs.
+#numWorkers: number of bnx files read at the same time (0 = number of CPUs divided by threads, at most maxIO).
+#spoolDir: directory for the spool files, default the directory of sink. needs free disk space about the size of the bnx files.
+#returns dict with the new bnx file name, the number of molecules, and the results of each bnx file.
+def merge_bnx(sources,selection=None,sink='some_great_data',threads=1,numWorkers=0,maxIO=4,spoolDir='',compress='',verbose=False):
+    sourceList = [os.fspath(s) for s in sources]
+    prefix = os.fspath(sink)
+    if len(sourceList) == 0:
+        raise ValueError('no bnx files to merge')
+
+    #sValue and strScanRange, the same as -s and -r. all scan numbers: a bnx file for each scan number is selected.
+    if selection is None:
+        sValue = 1
+        strScanRange = ''
+    elif isinstance(selection,str):
+        sValue = 0
+        strScanRange = selection
+    else:
+        sValue = 0
+        strScanRange = ','.join(str(s) for s in selection)
+
+    spoolParent = spoolDir
+    if len(spoolParent) == 0:
+        spoolParent = os.path.dirname(os.path.abspath(prefix))
+    tempDir = tempfile.mkdtemp(prefix='mergeBNXSpool_',dir=spoolParent)
+
+    numWorkers = batchWorkers(len(sourceList),numWorkers,maxIO,threads)
+    executor = concurrent.futures.ProcessPoolExecutor(numWorkers)
+    try:
+        #first step: read each bnx file once, in parallel, with a spool directory for each.
+        spoolDirList = []
+        for i in range(0,len(sourceList)):
+            spoolDirList.append(os.path.join(tempDir,str(i+1)))
+            os.mkdir(spoolDirList[-1])
+        if verbose:
+            print('Reading '+str(len(sourceList))+' BNX Files, '+str(numWorkers)+' at a time')
+        indexList = list(executor.map(indexMergeInput,[(sourceList[i],spoolDirList[i],threads) for i in range(0,len(sourceList))]))
+
+        #header lines of each bnx file, from the header spool file.
+        headerList = []
+        for d in spoolDirList:
+            infile = open(os.path.join(d,'header.bnx'),'rb')
+            headerList.append(infile.readlines())
+            infile.close()
+
+        labelChannels = headerValue(headerList[0],b'# Label Channels:')
+        for i in range(1,len(sourceList)):
+            if headerValue(headerList[i],b'# Label Channels:') != labelChannels:
+                raise ValueError('bnx files have different label channels, can not merge: '+sourceList[0]+' '+sourceList[i])
+
+        #scan numbers of each bnx file, selected runIDs, new runIDs and first molecule ID of each bnx file.
+        inputList = []
+        runIDOffset = 0
+        numMolecules = 0
+        scanHash = {}
+        for i in range(0,len(sourceList)):
+            maxColID,runIDList,runIDMaxColHash,molNumPerRunID = indexList[i]
+            runIDPerScan = determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash)
+            runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+            inputScanHash = parseScanRange(sValue,runIDToScanHash,strScanRange)
+            scanHash.update(inputScanHash)
+
+            selectedRunIDs = [str(r) for r in runIDList if str(runIDToScanHash[str(r)][0]) in inputScanHash]
+            numSelected = sum(molNumPerRunID.get(r,0) for r in selectedRunIDs)
+
+            inputList.append({'bnxFile':sourceList[i],'maxColID':maxColID,'runIDPerScan':runIDPerScan,'runIDList':runIDList,
+                              'runIDMaxColHash':runIDMaxColHash,'molNumPerRunID':molNumPerRunID,'runIDToScanHash':runIDToScanHash,
+                              'selectedRunIDs':selectedRunIDs,'runIDOffset':runIDOffset,'firstMoleculeID':numMolecules+1,
+                              'numMolecules':numSelected})
+
+            numMolecules += numSelected
+            if len(runIDList) > 0:
+                runIDOffset += max(runIDList)
+
+        #second step: write the molecules of the selected runIDs of each bnx file to a part file, in parallel.
+        partList = [os.path.join(tempDir,'part_'+str(i+1)+'.bnx') for i in range(0,len(sourceList))]
+        partArgs = [(spoolDirList[i],inputList[i]['selectedRunIDs'],inputList[i]['runIDOffset'],inputList[i]['firstMoleculeID'],partList[i])
+                    for i in range(0,len(sourceList))]
+        for i,numWritten in enumerate(executor.map(writeMergePart,partArgs)):
+            if numWritten != inputList[i]['numMolecules']:
+                raise ValueError('wrong number of molecules written from '+sourceList[i]+': '+str(numWritten)+' instead of '+str(inputList[i]['numMolecules']))
+
+        #new bnx file: header, then the part files in order of the bnx files.
+        if sValue == 0 and len(scanHash) > 0:
+            filename = prefix+'_'+list(scanHash.values())[0]+'merged.bnx'+compressSuffix(compress)
+        else:
+            filename = prefix+'_merged.bnx'+compressSuffix(compress)
+        if verbose:
+            print('Writing Merged BNX File:\t'+filename)
+
+        outfile = openOutputFile(filename,compress,threads)
+        try:
+            for line in mergeHeaders(headerList,[m['runIDOffset'] for m in inputList],numMolecules):
+                outfile.write(line)
+            for partFile in partList:
+                infile = open(partFile,'rb')
+                shutil.copyfileobj(infile,outfile,16*1024*1024)
+                infile.close()
+        finally:
+            outfile.close()
+
+    finally:
+        executor.shutdown()
+        shutil.rmtree(tempDir,True)
+
+    printMergeInformation(inputList,prefix)
+
+    return {'filename':filename,'numMolecules':numMolecules,'inputs':inputList}
+
+
+#function prints the runIDs of each bnx file of a merge, their new runIDs, scan numbers and number of molecules.
+def printMergeInformation(inputList,prefix):
+    outfile = open(prefix+'_merged_runIDs.txt','w')
+    outfile.write('# BnxFile\tRunID\tMergedRunID\tScanNumber\tNumMoleculesInRunID\tSelected\n')
+
+    for m in inputList:
+        selected = set(m['selectedRunIDs'])
+        for r in m['runIDList']:
+            outfile.write(m['bnxFile']+'\t'+str(r)+'\t'+str(r+m['runIDOffset'])+'\t'+str(m['runIDToScanHash'][str(r)][0])+'\t'+
+                          str(m['molNumPerRunID'].get(str(r),0))+'\t'+str(int(str(r) in selected))+'\n')
+
+    outfile.close()
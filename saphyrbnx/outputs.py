@@ -0,0 +1,151 @@
+# Output files of the split: each new bnx file gets an in-memory buffer that is written in large sequential chunks,
+# and at most maxOpen files are open at the same time. A file whose handle was closed to stay under maxOpen is opened
+# again in append mode when its next chunk is written.
+import threading
+from collections import OrderedDict
+
+from .bnxio import openOutputFile,copyByteRange
+
+#default size of the chunks written to each file, and default total memory of all buffers.
+CHUNK_SIZE = 4*1024*1024
+MEMORY_BUDGET = 256*1024*1024
+
+
+#class is one new bnx file of an OutputPool. write adds data to the buffer, the buffer is written to the file when it is
+#larger than the chunk size of the pool, or when the file is closed. write is called for each line, so it does little else.
+class OutputFile(object):
+    def __init__(self,pool,filename):
+        self.pool = pool
+        self.filename = filename
+        self.buffer = bytearray()
+        self.written = 0        #bytes written to the file, without buffer.
+        self.opened = False     #True after the file was opened once. it is then opened again in append mode.
+        self.closed = False
+
+    def write(self,data):
+        self.buffer += data
+        if len(self.buffer) >= self.pool.chunkSize:
+            self.flush()
+
+    #bytes written to the file so far, including the buffer.
+    def tell(self):
+        return self.written+len(self.buffer)
+
+    #write buffer to the file.
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+
+        self.pool.acquire(self).write(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = bytearray()
+
+    #copy bytes start to end of bnx file infile (memory map mm) to the file, see copyByteRange.
+    def copyRange(self,infile,mm,start,end):
+        self.flush()
+        copyByteRange(infile,mm,self.pool.acquire(self),start,end)
+        self.written += end-start
+
+    #True if patch can be used: the file is a plain file opened by the pool.
+    def canPatch(self):
+        return self.pool.opener is None and len(self.pool.compress) == 0
+
+    #write data over the bytes at offset of the file, for example to correct a number in the header.
+    def patch(self,offset,data):
+        self.flush()
+        self.pool.release(self)
+        outfile = open(self.filename,'r+b')
+        outfile.seek(offset)
+        outfile.write(data)
+        outfile.close()
+
+    def close(self):
+        if self.closed:
+            return
+        if not self.opened:     #nothing written, make an empty file.
+            self.pool.acquire(self)
+        self.flush()
+        self.pool.release(self)
+        self.closed = True
+
+
+#class opens the new bnx files of a split, see OutputFile. open(filename) is used as opener of openFiles.
+#maxOpen: maximum number of open file handles, the least recently used handle is closed when a new one is needed.
+#memoryBudget: maximum total bytes of all buffers. the chunk size of each file is memoryBudget divided by the number of
+#files, at most chunkSize and at least 64 kB.
+#compress, threads: compression of new bnx files, see openOutputFile.
+#opener: if given, opener(filename) opens each file instead (for example a sink function of split_by_scan). these files
+#can not be opened again, so they stay open until closed and are not counted in maxOpen.
+#files can be written from several threads (see pipeline.py), each file from one thread only. a file handle is then only
+#closed by an other thread if there are more files than maxOpen, so pipeline.py uses one writer thread in that case.
+class OutputPool(object):
+    def __init__(self,maxOpen=256,memoryBudget=MEMORY_BUDGET,compress='',threads=1,opener=None,chunkSize=CHUNK_SIZE):
+        self.maxOpen = max(1,maxOpen)
+        self.memoryBudget = memoryBudget
+        self.maxChunkSize = chunkSize
+        self.chunkSize = chunkSize
+        self.compress = compress
+        self.threads = threads
+        self.opener = opener
+
+        self.files = []
+        self.handles = OrderedDict()    #open handles, least recently used first. key OutputFile.
+        self.peakOpen = 0
+        self.lock = threading.Lock()    #lock of handles.
+
+    #function returns new OutputFile for filename. nothing is opened until data is written.
+    def open(self,filename):
+        outputFile = OutputFile(self,filename)
+        self.files.append(outputFile)
+        self.chunkSize = max(64*1024,min(self.maxChunkSize,self.memoryBudget//len(self.files)))
+        return outputFile
+
+    #function returns open handle of outputFile, opening it if needed.
+    def acquire(self,outputFile):
+        with self.lock:
+            return self.acquireHandle(outputFile)
+
+    def acquireHandle(self,outputFile):
+        if outputFile in self.handles:
+            self.handles.move_to_end(outputFile)
+            return self.handles[outputFile]
+
+        if self.opener is not None:
+            if outputFile.opened:
+                raise IOError('output file '+outputFile.filename+' of opener can not be opened again')
+            handle = self.opener(outputFile.filename)
+        else:
+            #close least recently used handles. the file is opened again in append mode when needed.
+            while len(self.handles) >= self.maxOpen:
+                self.handles.popitem(last=False)[1].close()
+            handle = openOutputFile(outputFile.filename,self.compress,self.threads,outputFile.opened)
+
+        outputFile.opened = True
+        self.handles[outputFile] = handle
+        self.peakOpen = max(self.peakOpen,len(self.handles))
+        return handle
+
+    #close handle of outputFile, if open.
+    def release(self,outputFile):
+        with self.lock:
+            handle = self.handles.pop(outputFile,None)
+        if handle is not None:
+            handle.close()
+
+    #close each file. if error, buffers are dropped and handles are closed without writing them, so that a failed run
+    #does not leave open handles or running compression programs.
+    def close(self,error=False):
+        if not error:
+            for f in self.files:
+                f.close()
+            return
+
+        for f in self.files:
+            f.buffer = bytearray()
+            f.closed = True
+
+        while len(self.handles) > 0:
+            try:
+                self.handles.popitem(last=False)[1].close()
+            except Exception:   #keep closing the other handles, the first error is raised by the caller.
+                pass
@@ -0,0 +1,143 @@
+# Run time statistics of split_by_scan: wall and CPU time of each step, bytes read and written, molecules per second,
+# peak memory, progress reports during long steps, and cProfile of a run.
+import os
+import sys
+import json
+import time
+import cProfile
+
+#optional: resource module for peak memory, not on Windows.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+#function returns CPU time in seconds of this process and of finished child processes (pool processes of -t,
+#pigz and zstd programs). child processes are counted when they end.
+def cpuTime():
+    t = os.times()
+    return t[0]+t[1]+t[2]+t[3]
+
+
+#function returns peak memory (resident set size) in MB of this process and of the largest finished child process.
+#None if the resource module is not available.
+def peakRSS():
+    if resource is None:
+        return None,None
+
+    #ru_maxrss is in kB on Linux, in bytes on macOS.
+    scale = 1024.0
+    if sys.platform == 'darwin':
+        scale = 1024.0*1024.0
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/scale,resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss/scale
+
+
+#class collects run time statistics of the steps of split_by_scan, see split_by_scan(stats=...).
+#each step is timed between startPhase and endPhase. during long steps (the reads of the bnx file) progress(done)
+#is called with the number of molecules done so far, and a progress report is printed every progressInterval seconds.
+#if callback is given, callback(event,data) is called with event 'progress' and the report dict, 'phase' and the
+#statistics of a finished step, and 'done' and the result of result(), for example to send the numbers to monitoring.
+class RunStats(object):
+    def __init__(self,progressInterval=0.0,callback=None):
+        self.progressInterval = progressInterval
+        self.callback = callback
+
+        #phaseList: statistics dict of each finished step, in order.
+        self.phaseList = []
+        self.phaseName = ''
+        self.phaseTotal = 0
+        self.phaseWall = 0.0
+        self.phaseCPU = 0.0
+        self.lastReport = 0.0
+
+        #totals of the run, set by split_by_scan.
+        self.startWall = time.perf_counter()
+        self.startCPU = cpuTime()
+        self.info = {}
+
+    #start step name. total: number of molecules of the step if known, else 0.
+    def startPhase(self,name,total=0):
+        self.phaseName = name
+        self.phaseTotal = total
+        self.phaseWall = time.perf_counter()
+        self.phaseCPU = cpuTime()
+        self.lastReport = self.phaseWall
+
+    #end current step. molecules: number of molecules read or written by the step. bytesRead: bytes read from files by the step.
+    def endPhase(self,molecules=0,bytesRead=0):
+        wall = time.perf_counter()-self.phaseWall
+        phase = {'name':self.phaseName,'wallSeconds':wall,'cpuSeconds':cpuTime()-self.phaseCPU,
+                 'molecules':molecules,'bytesRead':bytesRead,
+                 'moleculesPerSecond':molecules/wall if wall > 0 else 0.0,
+                 'MBPerSecond':bytesRead/1024.0/1024.0/wall if wall > 0 else 0.0}
+        self.phaseList.append(phase)
+        self.phaseName = ''
+
+        if self.callback is not None:
+            self.callback('phase',phase)
+
+    #number of molecules done in the current step. prints a progress report if progressInterval seconds passed since the last one.
+    def progress(self,done):
+        now = time.perf_counter()
+        if self.progressInterval <= 0 or now-self.lastReport < self.progressInterval:
+            return
+        self.lastReport = now
+
+        elapsed = now-self.phaseWall
+        report = {'name':self.phaseName,'molecules':done,'totalMolecules':self.phaseTotal,'wallSeconds':elapsed,
+                  'moleculesPerSecond':done/elapsed if elapsed > 0 else 0.0}
+
+        line = 'Progress:\t'+self.phaseName+'\t'+str(done)
+        if self.phaseTotal > 0:
+            line += ' of '+str(self.phaseTotal)+' molecules (%.1f%%)' % (100.0*done/self.phaseTotal)
+        else:
+            line += ' molecules'
+        line += '\t%.0f molecules/s\t%.1f s' % (report['moleculesPerSecond'],elapsed)
+        print(line,file=sys.stderr,flush=True)
+
+        if self.callback is not None:
+            self.callback('progress',report)
+
+    #function returns the statistics of the run as a dict that can be written as JSON.
+    def result(self):
+        wall = time.perf_counter()-self.startWall
+        peakSelf,peakChildren = peakRSS()
+
+        result = {'phases':self.phaseList,'wallSeconds':wall,'cpuSeconds':cpuTime()-self.startCPU,
+                  'peakRSSMB':peakSelf,'peakRSSChildrenMB':peakChildren}
+        result.update(self.info)
+
+        return result
+
+    #end of the run: calls callback with the result, returns the result.
+    def done(self):
+        result = self.result()
+        if self.callback is not None:
+            self.callback('done',result)
+
+        return result
+
+
+#function writes statistics stats (dict or list) as JSON to file statsFile, or to stdout if statsFile is '-'.
+def writeStats(stats,statsFile):
+    if statsFile == '-':
+        json.dump(stats,sys.stdout,indent=1)
+        sys.stdout.write('\n')
+        return
+
+    outfile = open(statsFile,'w')
+    json.dump(stats,outfile,indent=1)
+    outfile.write('\n')
+    outfile.close()
+
+
+#function runs function(*args,**kwargs) with cProfile, writes the profile to profileFile (read with pstats or snakeviz).
+#returns the return value of function.
+def runProfiled(profileFile,function,*args,**kwargs):
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function,*args,**kwargs)
+    finally:
+        profile.dump_stats(profileFile)
@@ -0,0 +1,177 @@
+# Pipelined read of the bnx file for readBNXFile (engine 'pipeline'): a reader thread reads large blocks of the bnx file
+# that end at the start of a molecule, the calling thread sends the lines of each block to the new bnx files of their
+# scan numbers, and writer threads write the data of each block to the new bnx files. Reading (and decompressing),
+# sorting lines and writing (and compressing) happen at the same time; file reads and writes release the GIL.
+import io
+import queue
+import threading
+
+from .bnxio import openBNXFile,hasCRLF
+from .split import writeTitle
+from .blocks import iterBlocks
+
+#maximum number of blocks read and not yet sorted, and of data blocks waiting for each writer thread.
+READ_QUEUE = 4
+WRITE_QUEUE = 16
+
+#maximum number of writer threads. each new bnx file is always written by the same writer thread.
+WRITER_THREADS = 8
+
+#first 4 bytes of the QX lines of a molecule written to the new bnx files.
+QX_LINES = (b'QX11',b'QX12',b'QX21',b'QX22')
+
+
+#function puts item in queue q. waits until there is room, unless stop is set (the other side of the queue stopped).
+def putItem(q,item,stop):
+    while not stop.is_set():
+        try:
+            q.put(item,timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+#function of the reader thread: reads bnx file filename in blocks of whole molecules, see iterBlocks. puts each block
+#in blockQueue, then None at the end of the file.
+#if reading fails, the exception is put in blockQueue instead.
+def readBlocks(filename,threads,blockQueue,stop):
+    try:
+        #if file has '\r\n' line endings, change to '\n' like reading the file in universal newline mode.
+        crlf = hasCRLF(filename)
+        infile = openBNXFile(filename,threads)
+
+        try:
+            for block in iterBlocks(infile):
+                if stop.is_set():
+                    break
+                if crlf:
+                    block = block.replace(b'\r\n',b'\n')
+                putItem(blockQueue,block,stop)
+        finally:
+            infile.close()
+
+        putItem(blockQueue,None,stop)
+    except BaseException as e:
+        putItem(blockQueue,e,stop)
+
+
+#class is a writer thread: writes the data of (outfile,data) items of its queue to outfile, until None.
+#if a write fails, the exception is kept in error and the following items are dropped, so that the queue does not block.
+class BlockWriter(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self,daemon=True)
+        self.queue = queue.Queue(WRITE_QUEUE)
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+
+            try:
+                item[0].write(item[1])
+            except BaseException as e:
+                self.error = e
+
+
+#function writes new bnx files like readBNXFile reading the bnx file line by line, see the top of this file.
+#openFileHash: open new bnx files, see openFiles. the files are not closed.
+#if progress is given, progress(numMolecules) is called every 100000 molecules read, see RunStats.progress.
+def pipelineBNXFile(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads=1,progress=None):
+    #outputList: each new bnx file once (if sValue = 0, all scan numbers have the same file).
+    outputList = []
+    for s in openFileHash:
+        if openFileHash[s] not in outputList:
+            outputList.append(openFileHash[s])
+
+    #if the files are in an OutputPool that can not keep all files open, one writer thread, so that a writer thread
+    #does not close the file of an other writer thread.
+    numWriters = max(1,min(WRITER_THREADS,len(outputList)))
+    if len(outputList) > 0 and hasattr(outputList[0],'pool') and len(outputList) > outputList[0].pool.maxOpen:
+        numWriters = 1
+
+    writerList = [BlockWriter() for i in range(0,numWriters)]
+    writerHash = {}     #key new bnx file, value its writer thread.
+    for i in range(0,len(outputList)):
+        writerHash[outputList[i]] = writerList[i % numWriters]
+
+    stop = threading.Event()
+    blockQueue = queue.Queue(READ_QUEUE)
+    reader = threading.Thread(target=readBlocks,args=(filename,threads,blockQueue,stop),daemon=True)
+    reader.start()
+    for w in writerList:
+        w.start()
+
+    #snum: scan number of the current molecule, None if the molecule is not written. kept from block to block.
+    snum = None
+
+    #number of molecules read, for progress.
+    numMolecules = 0
+
+    try:
+        while True:
+            block = blockQueue.get()
+            if block is None:
+                break
+            if isinstance(block,BaseException):
+                raise block
+
+            #bufferHash: for each scan number, buffer of the lines of this block for its new bnx file.
+            bufferList = [io.BytesIO() for f in outputList]
+            bufferOfFile = dict(zip(outputList,bufferList))
+            bufferHash = {}
+            for s in openFileHash:
+                bufferHash[s] = bufferOfFile[openFileHash[s]]
+
+            outfile = None  #buffer of the current molecule, None if the molecule is not written.
+            if snum is not None:
+                outfile = bufferHash[snum]
+
+            for line in io.BytesIO(block):     #iterate through each line in the block, the same as readBNXFile.
+                first = line[0:1]
+                if first == b'#':
+                    writeTitle(line,bufferHash,sValue,numMolPerFile)
+
+                elif first == b'0':     #molecule line 0: find scan number from runID.
+                    runID = line.split()[11].decode()
+                    snum = str(runIDToScanHash[runID][0])
+
+                    numMolecules += 1
+                    if progress is not None and numMolecules % 100000 == 0:
+                        progress(numMolecules)
+
+                    outfile = bufferHash.get(snum)
+                    if outfile is None:
+                        snum = None
+                    else:
+                        outfile.write(line)
+
+                elif first == b'1' or first == b'2' or line[0:4] in QX_LINES:
+                    if outfile is not None:
+                        outfile.write(line)
+
+            #send data of the block to the writer thread of each new bnx file.
+            for i in range(0,len(outputList)):
+                data = bufferList[i].getvalue()
+                if len(data) > 0:
+                    writer = writerHash[outputList[i]]
+                    if writer.error is not None:
+                        raise writer.error
+                    writer.queue.put((outputList[i],data))
+
+    finally:
+        #stop reader thread if the file was not read to the end. writer threads write what is in their queues.
+        stop.set()
+        for w in writerList:
+            w.queue.put(None)
+        for w in writerList:
+            w.join()
+        reader.join()
+
+    for w in writerList:
+        if w.error is not None:
+            raise w.error
+
@@ -0,0 +1,99 @@
+# Molecule records of a bnx file: the 0 line of a molecule and its 1, 2, QX11, QX12, QX21, QX22 lines.
+import os
+
+from .bnxio import openBNXFile
+
+
+#class holds one molecule of a bnx file as raw bytes, raw, exactly as in the bnx file.
+#the 0 line is only split into fields, and the 1, 2 and QX lines into values, when they are used.
+class MoleculeRecord(object):
+    __slots__ = ('raw','_word')
+
+    def __init__(self,raw):
+        self.raw = raw
+        self._word = None
+
+    #fields of the 0 line, split by whitespace. bytes.
+    @property
+    def word(self):
+        if self._word is None:
+            end = self.raw.find(b'\n')
+            if end < 0:
+                end = len(self.raw)
+            self._word = self.raw[0:end].split()
+        return self._word
+
+    @property
+    def moleculeID(self):
+        return int(self.word[1])
+
+    @property
+    def length(self):
+        return float(self.word[2])
+
+    @property
+    def numLabels(self):
+        return int(self.word[5])
+
+    #runID is a str, the same as the keys of runIDToScanHash.
+    @property
+    def runID(self):
+        return self.word[11].decode()
+
+    @property
+    def colID(self):
+        return int(self.word[12])
+
+    #list of lines of the molecule, bytes with line endings.
+    def lines(self):
+        return self.raw.splitlines(True)
+
+    #values of the line that begins with code (b'1', b'2', b'QX11', b'QX12', b'QX21' or b'QX22') as floats.
+    #returns None if the molecule has no such line.
+    def values(self,code):
+        for line in self.lines():
+            word = line.split()
+            if word[0] == code:
+                return [float(v) for v in word[1:]]
+        return None
+
+    def __repr__(self):
+        return 'MoleculeRecord(moleculeID='+str(self.moleculeID)+', runID='+self.runID+', colID='+str(self.colID)+')'
+
+
+#generator yields a MoleculeRecord for each molecule of bnx file source, in order of the file.
+#source is a file name (.gz and .zst files are decompressed with threads threads, see openBNXFile) or a file object open for reading bytes.
+#if header is a list, the header lines (lines beginning with '#') are added to it as they are read.
+#lines that are not header lines or lines of a molecule are skipped, the same as readBNXFile.
+def iter_molecules(source,header=None,threads=1):
+    if isinstance(source,(str,os.PathLike)):
+        infile = openBNXFile(os.fspath(source),threads)
+        closeFile = True
+    else:
+        infile = source
+        closeFile = False
+
+    #lines of the current molecule.
+    lines = []
+
+    try:
+        for line in infile:
+            if line[0:1] == b'0':   #0 line starts a new molecule.
+                if len(lines) > 0:
+                    yield MoleculeRecord(b''.join(lines))
+                lines = [line]
+
+            elif line[0:1] == b'1' or line[0:1] == b'2' or line[0:4] in (b'QX11',b'QX12',b'QX21',b'QX22'):
+                if len(lines) > 0:
+                    lines.append(line)
+
+            elif line[0:1] == b'#':
+                if header is not None:
+                    header.append(line)
+
+        if len(lines) > 0:
+            yield MoleculeRecord(b''.join(lines))
+
+    finally:
+        if closeFile:
+            infile.close()
@@ -0,0 +1,182 @@
+# Assigning runIDs to scan numbers, and selecting the scan numbers and number of molecules of each new bnx file.
+
+
+#based on maximum colID per runID compute the number of runIDs per scan.
+def determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash):
+    #list of computed number runIDs per bank on how many times the repetition of the maxColID value.
+    runIDPerBank = findRunIDPerBank(maxColID,runIDList,runIDMaxColHash)
+
+    #number of banks in a flow cell. Hard coded to be 4.0 for now.
+    numBanks = 4.0
+
+    #compute value for runIDPerScan, number of runIDs per scan.
+    #There are often issues due to sticking/streaking, low throughput, that result in no dna in some regions of a bank.
+    #if this is the case then the value of n (number of runIDs per bank) may be incorrect. This is handled by adding 
+    #many differet n values to runIDPerBank. The median value should be correct.
+    #numpy is only imported here, so that importing the package is fast.
+    import numpy as np
+    runIDPerScan = numBanks * np.median(runIDPerBank)     
+
+    return runIDPerScan
+
+
+#function returns list of the number of runIDs of each bank: a bank ends at a runID whose maximum colID is the
+#number of imaging columns per bank. runIDs after the last complete bank are not in the list.
+def findRunIDPerBank(maxColID,runIDList,runIDMaxColHash):
+    runIDPerBank = []
+
+    #a split FOV saphyr will have 137 imaging columns per bank --- sometimes the 137 columns are split to be 34, 34, 34, and 35 columnIDs per bank.
+    #a full FOV saphyr will have 69 imaging columns per bank.
+    #allow for some wiggle room regarding max number of columns per bank detected if chip is bad or loading is low.
+    if maxColID > 69:   #this case is for split FOV saphyr with 137 image columns per bank.
+        maxColID = 137
+    elif maxColID <= 69 and maxColID > 35:      #this case is for full FOV saphyr with 69 image columns per banks.
+        maxColID = 69
+    elif maxColID <= 35:    #this case for split FOV saphyr with 137 FOVS image columns per bank, but run ID contains 34, 34, 34, or 35 columnIDs (34+34+34+35=137)
+        maxColID = 35  
+
+    #n is the number of runIDs per bank.
+    n = 0
+
+    #iterate through each runID in runIDList.
+    for r in runIDList:
+        #if value of runIDMaxColHash[str(r)] equal to maxColID, then reached end of bank. iterate n, add n value to runIDPerBank, and reset n to 0. 
+        #runIDPerBank list of number of runIDs for each bank.
+        if runIDMaxColHash[str(r)] == maxColID:
+            n+=1
+            runIDPerBank.append(n)
+            n = 0
+        
+        #if value of runIDMaxColHash[str(r)] less than maxColID, then image columns have not reached end of bank. iterate n and continue.
+        elif runIDMaxColHash[str(r)] < maxColID:
+            n+=1
+
+    return runIDPerBank
+
+
+#function associates each runID to a scan number.
+def groupRunIDByScan(runIDList,runIDPerScan):
+
+    #start with scanNum = 1
+    scanNum = 1
+    #tempList is a list of runIDs within a single scan number. Will be reset once iterate to next scan.
+    tempList = []
+    #runIDToScanHash: key is runID value, value is a list with scan number, i.e. [scan#]
+    runIDToScanHash = {}
+
+    #iterate through each runID in runIDList.
+    for r in runIDList:
+        #add runID value to tempList.
+        tempList.append(r)
+
+        #if the number of runIDs in tempList equals the value of runIDPerScan (number of runIDs in a scan)
+        #then for each runID in tempList, add the scanNum value in a list [scanNum]. Remember, multiple runIDs will likely have the same scan number.
+        if len(tempList) == runIDPerScan:
+            for t in tempList:
+                runIDToScanHash[str(t)] = [scanNum]
+
+            #once the values in tempList have been added to runIDToScanHash, reset tempList to empty, iterate scanNum by 1.
+            tempList = []
+            scanNum+=1
+
+    #if run is interupted (i.e. did not finish imaging entire flow cell)
+    #then len(tempList) will be less runIDPerScan and never be added to runIDToScanHash.
+    #if values stilll present in tempList, then fill in remaining values in tempList with scanNum into runIDToScanHash
+    if len(tempList) > 0:
+        for t in tempList:
+            runIDToScanHash[str(t)] = [scanNum]        
+
+
+    return runIDToScanHash
+
+
+#function prints how runID and scan numbers were assigned.
+def printRunIDInformation(maxColID,runIDPerScan,runIDList,runIDMaxColHash,runIDToScanHash,molNumPerRunID,prefix):
+    outfile = open(prefix+'_runID_to_scan.txt','w')
+    outfile.write('# maxColID:\t'+str(maxColID)+'\n')
+    outfile.write('# Run IDs Per Scan:\t'+str(runIDPerScan)+'\n')
+
+    outfile.write('# RunID\tMaxColumnID\tScanNumber\tNumMoleculesInRunID\n')
+
+    for r in runIDList: #iterate through each r
+        outfile.write(str(r)+'\t'+str(runIDMaxColHash[str(r)])+'\t'+str(runIDToScanHash[str(r)][0])+'\t'+str(molNumPerRunID[str(r)])+'\n')
+
+    outfile.close()
+
+
+#function determines if should split bnx file for each scan number or for give range of scan numbers
+#returns scanHash that contains a string of potential Scan## names depending on how bnx file will be parsed.
+def parseScanRange(sValue,runIDToScanHash,strScanRange):
+    #scanHash. key = scan number, value = Scan## (or if range of scan values selected, Scan##-Scan##)
+    scanHash = {}
+
+    #rkeys is list of runID values.
+    rkeys = runIDToScanHash.keys()
+
+    if sValue == 1: #if sValue = 1, then generate bnx file for each scan number.
+        for r in rkeys:     #iterate through each runID value, r
+            s = str(runIDToScanHash[r][0])    #runIDToScanHash[r][0] is scan number
+
+            if s in scanHash:   #if s in scanHash, donothing
+                donothing = 1
+            else:               #else, add Scan## to scanHash[s]
+                scanHash[s] = 'Scan'+s.zfill(2)
+
+
+    elif sValue == 0:       #if sValue = 0, then generate bnx file for range of scan numbers based on user input.
+        rScan = strScanRange.split(',')     #for each ',' in strScanRange, split and place values into rScan.
+
+        scanName = ''
+        for r in rScan:
+            scanName+=r+'_'     #scanName will contain str of value, e.g. if strScanRange = 1-10,15-20 then scanName = 1-10_15-20
+
+        for r in rScan:         #for each range r (e.g. 1-10, 15-20, etc.) split value based on '-' to generate 1 or 2 numbers 
+            sValue = r.split('-')
+
+            if len(sValue) == 2:    #if split('-') results in 2 values in sValue, then interate between each value.
+                for i in range(int(sValue[0]),int(sValue[1])+1):
+                    if str(i) in scanHash:  #if i in scanHash, do nothing
+                        donothing = 1
+                    else:                   #else, add i to scanHash with value ScanRange_scanName (e.g. ScanRange_1-10)
+                        scanHash[str(i)] = 'ScanRange_'+scanName
+            elif len(sValue) == 1:  #if split('-') results in 1 values in sValue, then interate through the single value.
+                for i in range(int(sValue[0]),int(sValue[0])+1):
+                    if str(i) in scanHash:  #if i in scanHash, do nothing
+                        donothing = 1
+                    else:                   #else, add i to scanHash with value ScanRange_scanName (e.g. ScanRange_1)
+                        scanHash[str(i)] = 'ScanRange_'+scanName
+
+    return scanHash
+
+
+#function determines the number of molecules for each bnx file that will be generated
+def computeNumMoleculesPerBNX(sValue,runIDList,scanHash,runIDToScanHash,molNumPerRunID):
+
+    #if sValue = 1, then keys will be each scan number, value will be total number of molecules in scan
+    #if sValue = 0, then key will be 'one', value will be total number of molecules for given scan range.
+    numMolPerFile = {}
+
+
+    if sValue == 1:     #if sValue = 1, then generate bnx file for each scan number.
+        for r in runIDList:
+            scanNum = runIDToScanHash[str(r)][0]    #determine scan number value of runID, r
+
+            if str(scanNum) in scanHash:    #if scanNum in scanHash, then add number of molecules for runID, r, to numMolPerFile[str(scanNum)]
+                #if only one file being printed (sValue = 1), then numMolPerFile will a key for each scan number
+                if str(scanNum) in numMolPerFile:
+                    numMolPerFile[str(scanNum)] += molNumPerRunID[str(r)]
+                else:
+                    numMolPerFile[str(scanNum)] = molNumPerRunID[str(r)]        
+
+    if sValue == 0:     #if sValue = 0, then generate bnx file for range of scan numbers based on user input.
+        for r in runIDList:
+            scanNum = runIDToScanHash[str(r)][0]    #determine scan number value of runID, r
+
+            if str(scanNum) in scanHash:    #if scanNum in scanHash, then add number of molecules for runID, r, to numMolPerFile['one']
+                #if only one file being printed (sValue = 0), then numMolPerFile will have one key, 'one'
+                if 'one' in numMolPerFile:
+                    numMolPerFile['one'] += molNumPerRunID[str(r)]
+                else:
+                    numMolPerFile['one'] = molNumPerRunID[str(r)]
+
+    return numMolPerFile
@@ -0,0 +1,137 @@
+# Balanced shards: the molecules of the selected scan numbers are written to numShards new bnx files of about the same
+# size, by number of molecules or by bytes, instead of one bnx file per scan number. Each shard has whole runIDs (or
+# whole scans) in the order of the bnx file, so that downstream jobs get inputs of the same size.
+from .split import openFiles,writeOpenFiles
+from .bnxio import compressSuffix
+
+
+#function returns dict with the weight of each runID used to balance the shards, key runID.
+#shardBy: 'molecules', the number of molecules of the runID, or 'bytes', the bytes of the molecules of the runID in the
+#bnx file (runIDBytes, see bytesPerRunID), which grows with the total length of the molecules.
+def shardWeights(runIDList,molNumPerRunID,runIDBytes,shardBy):
+    weightHash = dict.fromkeys([str(r) for r in runIDList],0)
+
+    if shardBy == 'molecules':
+        for r in molNumPerRunID:
+            weightHash[r] = molNumPerRunID[r]
+    elif shardBy == 'bytes':
+        for r in runIDBytes:
+            weightHash[r] = runIDBytes[r]
+    else:
+        raise ValueError('unknown shardBy: '+str(shardBy))
+
+    return weightHash
+
+
+#function returns list of units of the selected scan numbers in scanHash, in order of runIDList. each unit is a list of
+#runIDs (str) that is never split between shards: one runID if shardAlign is 'runID', all runIDs of a scan if 'scan'.
+def shardUnits(runIDList,runIDToScanHash,scanHash,shardAlign):
+    if shardAlign not in ('runID','scan'):
+        raise ValueError('unknown shardAlign: '+str(shardAlign))
+
+    unitList = []
+    lastScan = None
+    for r in runIDList:
+        s = str(runIDToScanHash[str(r)][0])
+        if s not in scanHash:
+            continue
+
+        if shardAlign == 'runID' or s != lastScan:
+            unitList.append([])
+        unitList[-1].append(str(r))
+        lastScan = s
+
+    return unitList
+
+
+#function divides weightList (weight of each unit, in order) into numShards parts of units next to each other,
+#so that the largest part is as small as possible. returns list of the index of the first unit of each part.
+#numShards must be at most the number of units, each part has at least one unit.
+def balanceShards(weightList,numShards):
+    #largest part for maximum part weight maxWeight: fill parts in order, start a new part when the next unit does not fit,
+    #or when the units left are needed to give each part left one unit.
+    def fillParts(maxWeight):
+        starts = [0]
+        weight = 0
+        for i in range(0,len(weightList)):
+            unitsLeft = len(weightList)-i
+            partsLeft = numShards-len(starts)
+            if i > 0 and (weight+weightList[i] > maxWeight or unitsLeft == partsLeft) and partsLeft > 0:
+                starts.append(i)
+                weight = 0
+            weight += weightList[i]
+            if weight > maxWeight:
+                return None
+        return starts
+
+    #binary search of the smallest maximum part weight that can be filled.
+    low = max(weightList)
+    high = sum(weightList)
+    while low < high:
+        middle = (low+high)//2
+        if fillParts(middle) is None:
+            low = middle+1
+        else:
+            high = middle
+
+    return fillParts(low)
+
+
+#function writes the molecules of the selected scan numbers in scanHash to numShards new bnx files, see the top of this file.
+#weightHash: weight of each runID, see shardWeights. shardAlign: 'runID' or 'scan', see shardUnits.
+#new bnx file names are prefix_Shard01.bnx, ... (sValue = 1), or prefix_ScanRange_1-10_Shard01.bnx, ... (sValue = 0).
+#each new bnx file has all header lines, with the number of molecules of the shard. the molecules are written as in
+#writeOpenFiles, from blocks if blockList is given, else line by line with engine.
+#returns bytes read, shardHash (key shard number, value list of runIDs), numMolPerFile and filenameHash of the shards.
+def writeShards(sValue,numShards,shardAlign,weightHash,runIDList,runIDToScanHash,scanHash,molNumPerRunID,filename,prefix,
+                blockList=None,compress='',threads=1,opener=None,progress=None,engine='lines'):
+    unitList = shardUnits(runIDList,runIDToScanHash,scanHash,shardAlign)
+    if len(unitList) == 0:
+        raise ValueError('no runIDs in the selected scan numbers, no shards to write')
+
+    #no empty shards: at most one shard per unit.
+    numShards = min(numShards,len(unitList))
+    weightList = [sum(weightHash[r] for r in u) for u in unitList]
+    starts = balanceShards(weightList,numShards)+[len(unitList)]
+
+    #runIDToShardHash: key runID, value [shard number], like runIDToScanHash. runIDs of scan numbers not selected are in shard 0,
+    #which is not written.
+    runIDToShardHash = {}
+    for r in runIDList:
+        runIDToShardHash[str(r)] = [0]
+
+    shardHash = {}
+    numMolPerFile = {}
+    filenameHash = {}
+    for i in range(0,numShards):
+        shard = str(i+1)
+        shardHash[shard] = [r for u in unitList[starts[i]:starts[i+1]] for r in u]
+        numMolPerFile[shard] = 0
+        for r in shardHash[shard]:
+            runIDToShardHash[r] = [i+1]
+            numMolPerFile[shard] += molNumPerRunID.get(r,0)
+
+        if sValue == 0:
+            name = scanHash[str(runIDToScanHash[shardHash[shard][0]][0])]+'Shard'+shard.zfill(2)
+        else:
+            name = 'Shard'+shard.zfill(2)
+        filenameHash[shard] = prefix+'_'+name+'.bnx'+compressSuffix(compress)
+
+    #each shard is a separate file, written like the bnx file of a scan number with -s 1.
+    openFileHash = openFiles(1,filenameHash,compress,threads,opener)
+    bytesRead = writeOpenFiles(1,numMolPerFile,runIDToShardHash,filename,openFileHash,blockList,threads,progress,engine)
+
+    return bytesRead,shardHash,numMolPerFile,filenameHash
+
+
+#function prints the runIDs, scan numbers, number of molecules and weight of each shard.
+def printShardInformation(shardHash,runIDToScanHash,numMolPerFile,filenameHash,weightHash,shardBy,prefix):
+    outfile = open(prefix+'_shards.txt','w')
+    outfile.write('# Shard\tFileName\tFirstScan\tLastScan\tFirstRunID\tLastRunID\tNumRunIDs\tNumMolecules\t'+shardBy+'\n')
+
+    for shard in sorted(shardHash,key=int):
+        runIDs = shardHash[shard]
+        outfile.write(shard+'\t'+filenameHash[shard]+'\t'+str(runIDToScanHash[runIDs[0]][0])+'\t'+str(runIDToScanHash[runIDs[-1]][0])+'\t'+
+                      runIDs[0]+'\t'+runIDs[-1]+'\t'+str(len(runIDs))+'\t'+str(numMolPerFile[shard])+'\t'+str(sum(weightHash[r] for r in runIDs))+'\n')
+
+    outfile.close()
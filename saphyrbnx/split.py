@@ -0,0 +1,562 @@
+# Second read of the bnx file: writing new bnx files for each scan number or for a range of scan numbers.
+import os
+import mmap
+import shutil
+import tempfile
+
+from .bnxio import compressSuffix,openBNXFile,openOutputFile,copyByteRange,hasCRLF
+from .index import findNumberColumnsPerBank,indexBNXFile,spoolKeepsOrder,bytesPerRunID,spoolFileName,indexCacheFileName,readIndexCache,writeIndexCache
+from .outputs import OutputPool
+from .scans import determineRunIDPerScan,groupRunIDByScan,printRunIDInformation,parseScanRange,computeNumMoleculesPerBNX
+
+
+#header line, line, is bytes. new bnx files are written in binary mode.
+def writeTitle(line,openFileHash,sValue,numMolPerFile):
+    skeys = list(openFileHash.keys())     #list of scan numbers
+
+    if sValue == 0:     #print single bnx file for a range of scan numbers. pick first skey value.
+
+        if line[0:22] == b'# Number of Molecules:':  #add the number of molecules to the new bnx file.
+            openFileHash[skeys[0]].write(b'# Number of Molecules:\t'+str(numMolPerFile['one']).encode()+b'\n')
+        else:
+            openFileHash[skeys[0]].write(line)
+
+    elif sValue == 1:     #print bnx file for each scan number.
+        for s in skeys:
+            if line[0:22] == b'# Number of Molecules:':  #add the number of molecules to each scan number bnx file.
+                openFileHash[s].write(b'# Number of Molecules:\t'+str(numMolPerFile[s]).encode()+b'\n')
+            else:
+                openFileHash[s].write(line)
+
+
+#generate hash of new bnx file names.
+#if compress is 'gz' or 'zst', the file names end with .gz or .zst.
+def generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress=''):
+    #filenameHash: key=scan number, value is filename.
+    filenameHash = {}
+
+    rkeys = runIDToScanHash.keys()
+
+    #if sVavlue=0, then generate single bnx file for range of scan numbers
+    #scanHash[s] = ScanRange_1-10_15-20 (for example)
+    if sValue == 0:
+        for r in rkeys:     #iterate through each runID
+            s = str(runIDToScanHash[r][0])    #runIDToScanHash[r][0] is scan number
+
+            if s in scanHash:
+                if s in filenameHash:   #if s already in filenameHash, do nothing.
+                    donothing = 1
+                else:                   #else add s to filenameHash with new file name
+                    filenameHash[s] = prefix+'_'+scanHash[s]+'filtered.bnx'+compressSuffix(compress)
+
+    #if sVavlue=1, then generate bnx file for each scan number
+    #scanHash[s] = Scan01, Scan02, etc. for each s.
+    elif sValue == 1:
+        for r in rkeys:     #iterate through each runID
+            s = str(runIDToScanHash[r][0])    #runIDToScanHash[r][0] is scan number
+
+            if s in filenameHash:   #if s already in filenameHash, do nothing.
+                donothing = 1
+            else:                   #else add s to filenameHash with new file name
+                filenameHash[s] = prefix+'_'+scanHash[s]+'.bnx'+compressSuffix(compress)
+
+
+    return filenameHash
+
+
+#files are compressed if compress is 'gz' or 'zst', using threads for compression, see openOutputFile.
+#if opener is given, each file is opened with opener(filename) instead, which returns a file object for writing bytes.
+def openFiles(sValue,filenameHash,compress='',threads=1,opener=None):
+    if opener is None:
+        opener = lambda filename: openOutputFile(filename,compress,threads)
+
+    #openFileHash: value is scan number, value is open file object.
+    openFileHash = {}
+
+    #if sValue = 0, then print range of scan numbers in a single bnx file.
+    if sValue == 0:
+        skeys = list(filenameHash.keys()) #skeys is list of scan numbers to print in new bnx file.
+
+        for i in range(0,len(skeys)):
+            if i == 0:  #if i=0, open file, assign to fcode, place fcode in openFileHash[skeys[i]]
+                fcode = opener(filenameHash[skeys[0]])    #open for write!
+                openFileHash[skeys[i]] = fcode
+            else:   
+                openFileHash[skeys[i]] = fcode      #since only 1 file, assign fcode to each scan number, skeys[i]
+
+    #if sValue = 1, then print a bnx file for each scan number.
+    elif sValue == 1:
+        skeys = filenameHash.keys()     #skeys is list of scan numbers to print in new bnx file.
+
+        for s in skeys:
+            openFileHash[s] = opener(filenameHash[s])     #open each bnx file per scan. for write!
+
+    return openFileHash
+
+
+#function reads bnx file and generates new bnx files based on user input.
+#if blockList (from findNumberColumnsPerBank) is given, whole blocks of molecules are copied with copyBNXBlocks.
+#new bnx files are compressed if compress is 'gz' or 'zst'. threads is the number of threads for (de)compression.
+#opener, if given, opens the new bnx files, see openFiles.
+#if progress is given, progress(numMolecules) is called every 100000 molecules read line by line, see RunStats.progress.
+#engine: 'lines' reads the bnx file line by line in this thread. 'pipeline' reads, sorts and writes the lines in separate
+#threads at the same time, see pipelineBNXFile. 'bytes' reads blocks and writes molecules as slices of the blocks, see
+#bytesBNXFile. the new bnx files are the same.
+#returns the number of bytes read from the bnx file.
+def readBNXFile(sValue,numMolPerFile,scanHash,runIDToScanHash,filename,prefix,blockList=None,compress='',threads=1,opener=None,progress=None,engine='lines'):
+    #generate hash of new bnx file names based on user input.
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+    skeys = filenameHash.keys()     #fkeys is list of 
+
+    #openFiles function: adds open files object to a hash openFileHash
+    openFileHash = openFiles(sValue,filenameHash,compress,threads,opener)
+
+    #write new bnx files, close each file.
+    return writeOpenFiles(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,blockList,threads,progress,engine)
+
+
+#function writes new bnx files in openFileHash from bnx file filename, see readBNXFile, and closes them.
+#molecules of runIDs whose scan number is not in openFileHash are not written.
+#returns the number of bytes read from the bnx file.
+def writeOpenFiles(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,blockList=None,threads=1,progress=None,engine='lines'):
+    if blockList is not None:
+        bytesRead = copyBNXBlocks(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,blockList)
+    elif engine == 'pipeline':
+        from .pipeline import pipelineBNXFile
+        pipelineBNXFile(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads,progress)
+        bytesRead = os.path.getsize(filename)
+    elif engine == 'bytes':
+        from .blocks import bytesBNXFile
+        bytesBNXFile(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads,progress)
+        bytesRead = os.path.getsize(filename)
+    else:
+        readBNXLines(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads,progress)
+        bytesRead = os.path.getsize(filename)
+
+    skeys = openFileHash.keys()     #list of scan numbers in openFileHash.
+    for s in skeys:
+        openFileHash[s].close()     #close each file.
+
+    return bytesRead
+
+
+#function reads bnx file line by line and writes each molecule to the new bnx file of its scan number in openFileHash.
+#header lines are written with writeTitle.
+def readBNXLines(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,threads=1,progress=None):
+    #open original bnx file. read only! if file has '\r\n' line endings, change to '\n' like reading the file in universal newline mode.
+    crlf = hasCRLF(filename)
+    infile = openBNXFile(filename,threads)
+
+    #number of molecules read, for progress.
+    numMolecules = 0
+
+    for line in infile: #iterate through each line in bnx file.
+        if crlf:
+            line = line.replace(b'\r\n',b'\n')
+
+        if line[0:1] == b'#':
+            writeTitle(line,openFileHash,sValue,numMolPerFile)
+        else:
+            if line[0:1] == b'0':              #check data from line 0
+                keep = 0            #for each molecule, set keep=0, then check runID, scan number to determine if keep=1
+                word = line.split() #split line 0 based on white space.
+
+                runID = word[11].decode()   #runID, which connects the molecule to the respective scan number
+                snum = str(runIDToScanHash[runID][0])    #scan number 
+
+                numMolecules += 1
+                if progress is not None and numMolecules % 100000 == 0:
+                    progress(numMolecules)
+
+                if snum in openFileHash:    #if scan number in openFileHash, keep=1, write line in new bnx file.
+                    keep = 1
+                    openFileHash[snum].write(line)
+                else:                       #else, scan number not in openFileHash, keep = 0, do not write line in new bnx file.
+                    keep = 0
+
+            elif line[0:1] == b'1': #data from line 1, nick site locations, color 1
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+            elif line[0:1] == b'2': #data from line 1, nick site locations, color 2
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+            elif line[0:4] == b'QX11': #data color 1 SNR values.
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+            elif line[0:4] == b'QX12': #data color 1 intensity values.
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+            elif line[0:4] == b'QX21': #data color 2 SNR values.
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+            elif line[0:4] == b'QX22': #data color 2 intensity values.
+                if keep == 1:   #if keep = 1, then write line in new bnx file.
+                    openFileHash[snum].write(line)
+
+
+    infile.close()
+
+
+#function copies blocks of blockList from bnx file to new bnx files in openFileHash.
+#header lines are written with writeTitle. each block of molecules is copied from a memory map of the bnx file
+#to the bnx file of its scan number without reading each line, see copyByteRange.
+#returns the number of bytes read from the bnx file.
+def copyBNXBlocks(sValue,numMolPerFile,runIDToScanHash,filename,openFileHash,blockList):
+    infile = open(filename,'rb')    #open original bnx file. read only!
+
+    #empty file can not be memory mapped, and has no blocks.
+    if os.fstat(infile.fileno()).st_size == 0:
+        infile.close()
+        return 0
+
+    mm = mmap.mmap(infile.fileno(),0,access=mmap.ACCESS_READ)
+
+    #bytes of header lines and copied blocks.
+    bytesRead = 0
+
+    for b in blockList:     #iterate through each block, b = [key,start,end]
+        if b[0] == '#':     #block of header lines. write each line with writeTitle.
+            for line in mm[b[1]:b[2]].splitlines(True):
+                writeTitle(line,openFileHash,sValue,numMolPerFile)
+            bytesRead += b[2]-b[1]
+
+        elif b[0] != '':    #block of molecules of runID b[0].
+            snum = str(runIDToScanHash[b[0]][0])    #scan number
+
+            if snum in openFileHash:    #if scan number in openFileHash, copy block to new bnx file.
+                copyByteRange(infile,mm,openFileHash[snum],b[1],b[2])
+                bytesRead += b[2]-b[1]
+
+    mm.close()
+    infile.close()
+
+    return bytesRead
+
+
+#function generates new bnx files from spool files written by findNumberColumnsPerBank in single pass mode.
+#header lines are written with the corrected number of molecules, then the spool file of each runID
+#is copied to the bnx file of its scan number, in order of runIDList. returns the number of bytes read from spool files.
+#the new bnx files are the same as reading the bnx file again only if spoolKeepsOrder, see split_by_scan.
+def stitchSpoolFiles(sValue,numMolPerFile,scanHash,runIDToScanHash,runIDList,spoolDir,prefix,compress='',threads=1,opener=None):
+    #generate hash of new bnx file names based on user input.
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+
+    #openFiles function: adds open files object to a hash openFileHash
+    openFileHash = openFiles(sValue,filenameHash,compress,threads,opener)
+
+    bytesRead = os.path.getsize(os.path.join(spoolDir,'header.bnx'))
+    headerSpool = open(os.path.join(spoolDir,'header.bnx'),'rb')
+    for line in headerSpool:    #write header lines to each new bnx file.
+        writeTitle(line,openFileHash,sValue,numMolPerFile)
+    headerSpool.close()
+
+    for r in runIDList:     #iterate through each runID, copy spool file to bnx file of scan number.
+        snum = str(runIDToScanHash[str(r)][0])
+        spoolName = spoolFileName(spoolDir,r)
+
+        #runID without molecules has no spool file.
+        if snum in openFileHash and os.path.exists(spoolName):
+            spoolFile = open(spoolName,'rb')
+            shutil.copyfileobj(spoolFile,openFileHash[snum],16*1024*1024)
+            spoolFile.close()
+            bytesRead += os.path.getsize(spoolName)
+
+    skeys = openFileHash.keys()     #list of scan numbers in openFileHash.
+    for s in skeys:
+        openFileHash[s].close()     #close each file.
+
+    return bytesRead
+
+
+#function splits bnx file source by scan number, the same as the splitSaphyrBNXByScan.py command line.
+#selection: None to write a bnx file for each scan number (-s 1), or a range of scan numbers such as '1-10,15-20'
+#or a list of scan numbers, written to a single bnx file (-s 0 -r).
+#sink: output prefix of the new bnx files and of the runID to scan file (-p). or a function sink(name) that returns
+#a file object for writing bytes for each new bnx file name (for example 'Scan01.bnx'), the runID to scan file is not written then.
+#the other options are the same as the command line options. returns a dict with the results of each step.
+#stats: None, or a RunStats object that times each step and reports progress. the run time statistics are then also
+#returned in the dict, key 'stats'.
+#source may also be a columnar directory, see columnar.py. if columnar, the bnx file is converted to a columnar directory
+#(<bnxFile>.columnar or in cacheDir) if there is none for the current version of the bnx file, and split from it.
+#filters: None, or molecule filters from makeFilters (see filters.py). only molecules that pass the filters are written, and
+#the number of molecules in the header of each new bnx file is the number after filtering. the bnx file is then read
+#line by line (not singlePass or copyBlocks), or the filters are evaluated on the columns of the columnar directory.
+#new bnx files are written through an OutputPool: at most maxOpenFiles files are open at the same time, and each file has
+#a buffer that is written in large chunks, all buffers together at most outputBufferMB MB.
+#engine: 'lines', or 'pipeline' to read the bnx file line by line with reader, sorting and writer threads at the same time
+#(not singlePass or copyBlocks), see pipeline.py, or 'bytes' to read the bnx file both times in large blocks with
+#the bytes engine (not singlePass or copyBlocks), see blocks.py. filters and columnar directories use their own reads.
+#numShards: if more than 0, the molecules of the selected scan numbers are written to numShards new bnx files of about the
+#same number of molecules (shardBy 'molecules') or bytes ('bytes') instead, each with whole runIDs (shardAlign 'runID') or
+#whole scans ('scan'), see shards.py. returned in the dict as shardHash, the runIDs of each shard.
+def split_by_scan(source,selection=None,sink='some_great_data',threads=1,singlePass=False,spoolDir='',copyBlocks=True,
+                  compress='',indexCache=False,cacheDir='',verbose=False,stats=None,columnar=False,filters=None,
+                  maxOpenFiles=256,outputBufferMB=256,engine='lines',numShards=0,shardBy='molecules',shardAlign='runID'):
+    filename = os.fspath(source)
+    if engine not in ('lines','pipeline','bytes'):
+        raise ValueError('unknown engine: '+str(engine))
+
+    #engines 'pipeline' and 'bytes' read the bnx file the second time themselves, blocks and spool files are not used.
+    if engine != 'lines':
+        singlePass = False
+        copyBlocks = False
+
+    #filters need each molecule to be read, spool files and blocks are not used.
+    if filters is not None:
+        singlePass = False
+        copyBlocks = False
+
+    #shards are written from the bnx file, not from spool files.
+    if numShards > 0:
+        if filters is not None or columnar or os.path.isdir(filename):
+            raise ValueError('shards can not be used with filters or a columnar directory')
+        singlePass = False
+
+    #progress: function called with the number of molecules done while reading the bnx file.
+    progress = None
+    if stats is not None:
+        progress = stats.progress
+
+    #sValue and strScanRange, the same as -s and -r.
+    if selection is None:
+        sValue = 1
+        strScanRange = ''
+    elif isinstance(selection,str):
+        sValue = 0
+        strScanRange = selection
+    else:
+        sValue = 0
+        strScanRange = ','.join(str(s) for s in selection)
+
+    #prefix of new bnx files. if sink is a function, names have no prefix, generateFileNames adds '_' before the name.
+    sinkOpener = None
+    if callable(sink):
+        prefix = ''
+        sinkOpener = lambda name: sink(name[1:])
+    else:
+        prefix = os.fspath(sink)
+
+    #pool of new bnx files. opener opens each new bnx file in the pool, see openFiles.
+    pool = OutputPool(maxOpenFiles,outputBufferMB*1024*1024,compress,threads,sinkOpener)
+    opener = pool.open
+
+    #if indexCache, read results of findNumberColumnsPerBank from index cache file, if it is up to date.
+    #columnarBNX: ColumnarBNX of the columnar directory to split from, or None.
+    columnarBNX = None
+    if os.path.isdir(filename) or columnar:
+        #numpy is only imported if a columnar directory is used.
+        from .columnar import ColumnarBNX,convert_to_columnar,columnarDirName,columnarUpToDate,splitColumnar
+
+        if os.path.isdir(filename):
+            columnarDir = filename
+        else:
+            columnarDir = columnarDirName(filename,cacheDir)
+            if not columnarUpToDate(filename,columnarDir):
+                if verbose:
+                    print('Converting BNX File To Columnar Directory:\t'+columnarDir)
+                if stats is not None:
+                    stats.startPhase('convert_to_columnar')
+                convert_to_columnar(filename,columnarDir,threads)
+                if stats is not None:
+                    stats.endPhase(0,os.path.getsize(filename))
+            elif verbose:
+                print('Reading Columnar Directory:\t'+columnarDir)
+        columnarBNX = ColumnarBNX(columnarDir)
+
+    if stats is not None:
+        stats.startPhase('findNumberColumnsPerBank')
+    cacheFile = ''
+    cacheResults = None
+    if indexCache and columnarBNX is None:
+        cacheFile = indexCacheFileName(filename,cacheDir)
+        cacheResults = readIndexCache(filename,cacheFile)
+
+    #tempDir: temporary directory for spool files in single pass mode. removed at the end.
+    tempDir = ''
+    try:
+        if columnarBNX is not None:
+            #runIDs, maximum colID and number of molecules per runID from the runID and colID columns.
+            maxColID,runIDList,runIDMaxColHash,molNumPerRunID = columnarBNX.scanIndex()
+            blockList = None
+            runIDBytes = None
+            singlePass = False
+
+        elif cacheResults is not None:
+            if verbose:
+                print('Reading Index Cache File:\t'+cacheFile)
+            maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,runIDBytes = cacheResults
+
+            #bnx file will be read only once by readBNXFile. no spool files needed.
+            singlePass = False
+
+        else:
+            if singlePass:
+                spoolParent = spoolDir
+                if len(spoolParent) == 0:
+                    spoolParent = os.path.dirname(os.path.abspath(prefix if len(prefix) > 0 else filename))
+                tempDir = tempfile.mkdtemp(prefix='splitBNXSpool_',dir=spoolParent)
+
+            #function finds maximum number of imaging columns, runIDs. blockList is None if its byte offsets can not be used,
+            #see findNumberColumnsPerBank.
+            maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,offsetsUsable = indexBNXFile(filename,tempDir,threads,progress,engine)
+
+            #header lines after the first molecule, or runIDs out of order: the spool files can not give the same new bnx
+            #files, read the bnx file a second time instead.
+            if singlePass and not spoolKeepsOrder(blockList,runIDList):
+                if verbose:
+                    print('Header Lines Or RunIDs Out Of Order In BNX File, Reading BNX File Again Instead Of Spool Files:\t'+filename)
+                singlePass = False
+
+            #bytes of the molecules of each runID, also if the byte offsets of blockList can not be used.
+            runIDBytes = bytesPerRunID(blockList,runIDList)
+            if not offsetsUsable:
+                blockList = None
+
+            if indexCache:
+                writeIndexCache(filename,cacheFile,maxColID,runIDList,runIDMaxColHash,molNumPerRunID,blockList,runIDBytes)
+
+        #total number of molecules in bnx file.
+        numMolecules = sum(molNumPerRunID.values())
+        if stats is not None:
+            #bnx file is not read if index cache file is used.
+            stats.endPhase(numMolecules,0 if cacheResults is not None or columnarBNX is not None else os.path.getsize(filename))
+
+        #weight of each runID for balancing shards.
+        if numShards > 0:
+            from .shards import shardWeights,writeShards,printShardInformation
+            weightHash = shardWeights(runIDList,molNumPerRunID,runIDBytes,shardBy)
+
+        #if not copyBlocks, do not use byte offsets of blocks.
+        if not copyBlocks:
+            blockList = None
+
+        #function determines number of runID values per scan.
+        if stats is not None:
+            stats.startPhase('determineRunIDPerScan')
+        runIDPerScan = determineRunIDPerScan(maxColID,runIDList,runIDMaxColHash)
+        if stats is not None:
+            stats.endPhase()
+
+        #function determines the scan number for each runID.
+        if stats is not None:
+            stats.startPhase('groupRunIDByScan')
+        runIDToScanHash = groupRunIDByScan(runIDList,runIDPerScan)
+        if stats is not None:
+            stats.endPhase()
+
+        #print simple text file. Print each scan number, runID value.
+        if len(prefix) > 0:
+            printRunIDInformation(maxColID,runIDPerScan,runIDList,runIDMaxColHash,runIDToScanHash,molNumPerRunID,prefix)
+
+        #determine how to parse up the scan numbers, each scan number or range of scan numbers.
+        scanHash = parseScanRange(sValue,runIDToScanHash,strScanRange)
+
+        #compute total number of molecules for each new bnx file.
+        numMolPerFile = computeNumMoleculesPerBNX(sValue,runIDList,scanHash,runIDToScanHash,molNumPerRunID)
+
+        #filteredMolNumPerRunID: number of molecules of each runID that pass the filters.
+        filteredMolNumPerRunID = molNumPerRunID
+
+        if columnarBNX is not None:
+            if verbose:
+                print('Writing, Filtering BNX File From Columnar Directory:\t'+columnarBNX.columnarDir)
+            #copy molecules of selected scan numbers from the columnar directory.
+            if stats is not None:
+                stats.startPhase('splitColumnar')
+
+            #filter mask from the columns, number of molecules of each new bnx file after filtering.
+            mask = None
+            if filters is not None:
+                from .filters import columnarFilterMask,countPerRunID
+                mask = columnarFilterMask(columnarBNX,filters)
+                filteredMolNumPerRunID = countPerRunID(molNumPerRunID,columnarBNX.columns['runID'],mask)
+                numMolPerFile = computeNumMoleculesPerBNX(sValue,runIDList,scanHash,runIDToScanHash,filteredMolNumPerRunID)
+
+            bytesRead = splitColumnar(sValue,numMolPerFile,scanHash,runIDToScanHash,columnarBNX,prefix,compress,threads,opener,mask)
+
+        elif filters is not None:
+            if verbose:
+                print('Reading, Filtering BNX File, Filtering Molecules:\t'+filename)
+            #read bnx file, write molecules that pass the filters. numpy is only imported if filters are used.
+            from .filters import filterBNXFile
+            if stats is not None:
+                stats.startPhase('filterBNXFile',numMolecules)
+            bytesRead,filteredMolNumPerRunID,numMolPerFile = filterBNXFile(sValue,numMolPerFile,scanHash,runIDToScanHash,runIDList,molNumPerRunID,
+                                                                           filename,prefix,filters,compress,threads,opener,progress)
+
+        elif numShards > 0:
+            if verbose:
+                print('Reading, Writing BNX File In '+str(numShards)+' Shards:\t'+filename)
+            #write molecules of the selected scan numbers to numShards new bnx files of about the same size.
+            if stats is not None:
+                stats.startPhase('writeShards',numMolecules)
+            bytesRead,shardHash,numMolPerFile,shardFilenameHash = writeShards(sValue,numShards,shardAlign,weightHash,runIDList,runIDToScanHash,scanHash,
+                                                                              molNumPerRunID,filename,prefix,blockList,compress,threads,opener,progress,engine)
+            if len(prefix) > 0:
+                printShardInformation(shardHash,runIDToScanHash,numMolPerFile,shardFilenameHash,weightHash,shardBy,prefix)
+
+        elif singlePass:
+            if verbose:
+                print('Writing, Filtering BNX File From Spool Files:\t'+filename)
+            #combine spool files into new bnx file based on user input.
+            if stats is not None:
+                stats.startPhase('stitchSpoolFiles')
+            bytesRead = stitchSpoolFiles(sValue,numMolPerFile,scanHash,runIDToScanHash,runIDList,tempDir,prefix,compress,threads,opener)
+        else:
+            if verbose:
+                print('Reading, Filtering BNX File:\t'+filename)
+            #read bnx file and generate new bnx file based on user input.
+            if stats is not None:
+                stats.startPhase('readBNXFile',numMolecules)
+            bytesRead = readBNXFile(sValue,numMolPerFile,scanHash,runIDToScanHash,filename,prefix,blockList,compress,threads,opener,progress,engine)
+
+        #molecules of the step: each molecule is read if the bnx file is read line by line, else only the molecules written.
+        numMolWritten = sum(numMolPerFile.values())
+        if stats is not None:
+            if singlePass or blockList is not None or columnarBNX is not None:
+                stats.endPhase(numMolWritten,bytesRead)
+            else:
+                stats.endPhase(numMolecules,bytesRead)
+
+    except BaseException:
+        #close new bnx files that are still open, without writing their buffers.
+        pool.close(True)
+        raise
+
+    finally:
+        if len(tempDir) > 0:
+            shutil.rmtree(tempDir,True)
+
+    filenameHash = generateFileNames(sValue,scanHash,runIDToScanHash,prefix,compress)
+    if numShards > 0:
+        filenameHash = shardFilenameHash
+    result = {'maxColID':maxColID,'runIDPerScan':runIDPerScan,'runIDList':runIDList,'runIDMaxColHash':runIDMaxColHash,
+              'molNumPerRunID':molNumPerRunID,'runIDToScanHash':runIDToScanHash,'scanHash':scanHash,'numMolPerFile':numMolPerFile,
+              'filenameHash':filenameHash,'filteredMolNumPerRunID':filteredMolNumPerRunID}
+    if numShards > 0:
+        result['shardHash'] = shardHash
+
+    if stats is not None:
+        #bytes written: size of new bnx files. not known if sink is a function.
+        bytesWritten = None
+        if sinkOpener is None:
+            bytesWritten = sum(os.path.getsize(f) for f in set(filenameHash.values()))
+
+        if columnarBNX is not None:
+            bytesInput = os.path.getsize(os.path.join(columnarBNX.columnarDir,'records.bin'))
+        else:
+            bytesInput = os.path.getsize(filename)
+
+        stats.info.update({'bnxFile':filename,'bytesInput':bytesInput,'bytesWritten':bytesWritten,'columnar':columnarBNX is not None,
+                           'numMolecules':numMolecules,'numMoleculesWritten':numMolWritten,
+                           'openOutputFiles':pool.peakOpen,'indexCacheHit':cacheResults is not None,
+                           'singlePass':singlePass,'copyBlocks':blockList is not None,'threads':threads,
+                           'filters':filters,'engine':engine,'numShards':len(filenameHash) if numShards > 0 else 0})
+        result['stats'] = stats.done()
+
+    return result